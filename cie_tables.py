@@ -0,0 +1,109 @@
+# Generated by tools/build_mpy.py, do not edit.
+#
+# pwm_lightness.get_pwm_table(255, 255, 2), the CIE 1931 tables of the LED
+# strip, one per temporal dithering layer
+
+STRIP_8B = (
+    b'\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x01\x01\x01\x01\x01\x01'
+    b'\x01\x01\x01\x02\x02\x02\x02\x02\x02\x02\x02\x03\x03\x03\x03\x03'
+    b'\x03\x03\x04\x04\x04\x04\x04\x05\x05\x05\x05\x05\x06\x06\x06\x06'
+    b'\x06\x07\x07\x07\x07\x08\x08\x08\x08\x09\x09\x09\x0a\x0a\x0a\x0b'
+    b'\x0b\x0b\x0c\x0c\x0c\x0d\x0d\x0d\x0e\x0e\x0e\x0f\x0f\x10\x10\x10'
+    b'\x11\x11\x12\x12\x13\x13\x14\x14\x15\x15\x16\x16\x17\x17\x18\x18'
+    b'\x19\x19\x1a\x1a\x1b\x1c\x1c\x1d\x1d\x1e\x1f\x1f\x20\x21\x21\x22'
+    b'\x23\x23\x24\x25\x25\x26\x27\x28\x28\x29\x2a\x2b\x2c\x2c\x2d\x2e'
+    b'\x2f\x30\x31\x31\x32\x33\x34\x35\x36\x37\x38\x39\x3a\x3b\x3c\x3d'
+    b'\x3e\x3f\x40\x41\x42\x43\x44\x45\x46\x47\x48\x49\x4b\x4c\x4d\x4e'
+    b'\x4f\x50\x52\x53\x54\x55\x57\x58\x59\x5a\x5c\x5d\x5e\x60\x61\x63'
+    b'\x64\x65\x67\x68\x6a\x6b\x6c\x6e\x6f\x71\x72\x74\x76\x77\x79\x7a'
+    b'\x7c\x7d\x7f\x81\x82\x84\x86\x87\x89\x8b\x8d\x8e\x90\x92\x94\x95'
+    b'\x97\x99\x9b\x9d\x9f\xa1\xa2\xa4\xa6\xa8\xaa\xac\xae\xb0\xb2\xb4'
+    b'\xb6\xb9\xbb\xbd\xbf\xc1\xc3\xc5\xc8\xca\xcc\xce\xd0\xd3\xd5\xd7'
+    b'\xda\xdc\xde\xe1\xe3\xe6\xe8\xea\xed\xef\xf2\xf4\xf7\xf9\xfc\xff',
+    b'\x00\x00\x00\x00\x00\x01\x01\x01\x01\x01\x01\x01\x01\x01\x02\x02'
+    b'\x02\x02\x02\x02\x02\x02\x02\x03\x03\x03\x03\x03\x03\x03\x03\x04'
+    b'\x04\x04\x04\x04\x04\x05\x05\x05\x05\x05\x06\x06\x06\x06\x06\x07'
+    b'\x07\x07\x07\x08\x08\x08\x08\x09\x09\x09\x0a\x0a\x0a\x0a\x0b\x0b'
+    b'\x0b\x0c\x0c\x0c\x0d\x0d\x0d\x0e\x0e\x0f\x0f\x0f\x10\x10\x11\x11'
+    b'\x11\x12\x12\x13\x13\x14\x14\x15\x15\x16\x16\x17\x17\x18\x18\x19'
+    b'\x19\x1a\x1a\x1b\x1c\x1c\x1d\x1d\x1e\x1f\x1f\x20\x20\x21\x22\x22'
+    b'\x23\x24\x25\x25\x26\x27\x27\x28\x29\x2a\x2b\x2b\x2c\x2d\x2e\x2f'
+    b'\x2f\x30\x31\x32\x33\x34\x35\x36\x36\x37\x38\x39\x3a\x3b\x3c\x3d'
+    b'\x3e\x3f\x40\x41\x42\x43\x44\x46\x47\x48\x49\x4a\x4b\x4c\x4d\x4f'
+    b'\x50\x51\x52\x53\x55\x56\x57\x58\x5a\x5b\x5c\x5e\x5f\x60\x62\x63'
+    b'\x64\x66\x67\x69\x6a\x6c\x6d\x6e\x70\x71\x73\x74\x76\x78\x79\x7b'
+    b'\x7c\x7e\x80\x81\x83\x84\x86\x88\x8a\x8b\x8d\x8f\x91\x92\x94\x96'
+    b'\x98\x9a\x9b\x9d\x9f\xa1\xa3\xa5\xa7\xa9\xab\xad\xaf\xb1\xb3\xb5'
+    b'\xb7\xb9\xbb\xbd\xbf\xc1\xc4\xc6\xc8\xca\xcc\xcf\xd1\xd3\xd6\xd8'
+    b'\xda\xdc\xdf\xe1\xe4\xe6\xe8\xeb\xed\xf0\xf2\xf5\xf7\xfa\xfc\xff',
+    b'\x00\x00\x00\x00\x00\x00\x00\x01\x01\x01\x01\x01\x01\x01\x01\x01'
+    b'\x02\x02\x02\x02\x02\x02\x02\x02\x02\x03\x03\x03\x03\x03\x03\x03'
+    b'\x04\x04\x04\x04\x04\x04\x05\x05\x05\x05\x05\x06\x06\x06\x06\x06'
+    b'\x07\x07\x07\x07\x08\x08\x08\x08\x09\x09\x09\x0a\x0a\x0a\x0a\x0b'
+    b'\x0b\x0b\x0c\x0c\x0c\x0d\x0d\x0e\x0e\x0e\x0f\x0f\x0f\x10\x10\x11'
+    b'\x11\x12\x12\x12\x13\x13\x14\x14\x15\x15\x16\x16\x17\x17\x18\x18'
+    b'\x19\x1a\x1a\x1b\x1b\x1c\x1c\x1d\x1e\x1e\x1f\x20\x20\x21\x22\x22'
+    b'\x23\x24\x24\x25\x26\x26\x27\x28\x29\x29\x2a\x2b\x2c\x2d\x2d\x2e'
+    b'\x2f\x30\x31\x32\x33\x33\x34\x35\x36\x37\x38\x39\x3a\x3b\x3c\x3d'
+    b'\x3e\x3f\x40\x41\x42\x43\x44\x45\x46\x47\x49\x4a\x4b\x4c\x4d\x4e'
+    b'\x50\x51\x52\x53\x54\x56\x57\x58\x59\x5b\x5c\x5d\x5f\x60\x61\x63'
+    b'\x64\x66\x67\x68\x6a\x6b\x6d\x6e\x70\x71\x73\x74\x76\x77\x79\x7a'
+    b'\x7c\x7e\x7f\x81\x83\x84\x86\x88\x89\x8b\x8d\x8f\x90\x92\x94\x96'
+    b'\x97\x99\x9b\x9d\x9f\xa1\xa3\xa5\xa7\xa9\xab\xad\xaf\xb1\xb3\xb5'
+    b'\xb7\xb9\xbb\xbd\xbf\xc1\xc3\xc6\xc8\xca\xcc\xce\xd1\xd3\xd5\xd8'
+    b'\xda\xdc\xdf\xe1\xe3\xe6\xe8\xeb\xed\xf0\xf2\xf5\xf7\xfa\xfc\xff',
+    b'\x00\x00\x00\x01\x01\x01\x01\x01\x01\x01\x01\x01\x02\x02\x02\x02'
+    b'\x02\x02\x02\x02\x02\x03\x03\x03\x03\x03\x03\x03\x03\x04\x04\x04'
+    b'\x04\x04\x04\x05\x05\x05\x05\x05\x05\x06\x06\x06\x06\x06\x07\x07'
+    b'\x07\x07\x08\x08\x08\x08\x09\x09\x09\x09\x0a\x0a\x0a\x0b\x0b\x0b'
+    b'\x0c\x0c\x0c\x0d\x0d\x0d\x0e\x0e\x0e\x0f\x0f\x10\x10\x10\x11\x11'
+    b'\x12\x12\x12\x13\x13\x14\x14\x15\x15\x16\x16\x17\x17\x18\x18\x19'
+    b'\x19\x1a\x1b\x1b\x1c\x1c\x1d\x1e\x1e\x1f\x1f\x20\x21\x21\x22\x23'
+    b'\x23\x24\x25\x26\x26\x27\x28\x28\x29\x2a\x2b\x2c\x2c\x2d\x2e\x2f'
+    b'\x30\x30\x31\x32\x33\x34\x35\x36\x37\x38\x39\x3a\x3a\x3b\x3c\x3d'
+    b'\x3e\x3f\x40\x42\x43\x44\x45\x46\x47\x48\x49\x4a\x4b\x4c\x4e\x4f'
+    b'\x50\x51\x52\x54\x55\x56\x57\x59\x5a\x5b\x5d\x5e\x5f\x61\x62\x63'
+    b'\x65\x66\x67\x69\x6a\x6c\x6d\x6f\x70\x72\x73\x75\x76\x78\x79\x7b'
+    b'\x7d\x7e\x80\x81\x83\x85\x86\x88\x8a\x8c\x8d\x8f\x91\x93\x94\x96'
+    b'\x98\x9a\x9c\x9e\x9f\xa1\xa3\xa5\xa7\xa9\xab\xad\xaf\xb1\xb3\xb5'
+    b'\xb7\xb9\xbb\xbd\xc0\xc2\xc4\xc6\xc8\xca\xcd\xcf\xd1\xd3\xd6\xd8'
+    b'\xda\xdd\xdf\xe1\xe4\xe6\xe9\xeb\xee\xf0\xf3\xf5\xf8\xfa\xfd\xff'
+)
+
+# pwm_lightness.get_pwm_table(4080, 255), the table of main.STRIP_DEPTH
+# as little endian 16-bit values
+
+STRIP_12B = (
+    b'\x00\x00\x02\x00\x04\x00\x05\x00\x07\x00\x09\x00\x0b\x00\x0c\x00'
+    b'\x0e\x00\x10\x00\x12\x00\x13\x00\x15\x00\x17\x00\x19\x00\x1b\x00'
+    b'\x1c\x00\x1e\x00\x20\x00\x22\x00\x23\x00\x25\x00\x27\x00\x29\x00'
+    b'\x2b\x00\x2d\x00\x2f\x00\x31\x00\x33\x00\x36\x00\x38\x00\x3a\x00'
+    b'\x3d\x00\x3f\x00\x42\x00\x45\x00\x47\x00\x4a\x00\x4d\x00\x50\x00'
+    b'\x53\x00\x56\x00\x59\x00\x5d\x00\x60\x00\x64\x00\x67\x00\x6b\x00'
+    b'\x6e\x00\x72\x00\x76\x00\x7a\x00\x7e\x00\x82\x00\x86\x00\x8b\x00'
+    b'\x8f\x00\x93\x00\x98\x00\x9d\x00\xa1\x00\xa6\x00\xab\x00\xb0\x00'
+    b'\xb5\x00\xbb\x00\xc0\x00\xc5\x00\xcb\x00\xd1\x00\xd6\x00\xdc\x00'
+    b'\xe2\x00\xe8\x00\xef\x00\xf5\x00\xfb\x00\x02\x01\x08\x01\x0f\x01'
+    b'\x16\x01\x1d\x01\x24\x01\x2b\x01\x32\x01\x3a\x01\x41\x01\x49\x01'
+    b'\x51\x01\x59\x01\x61\x01\x69\x01\x71\x01\x7a\x01\x82\x01\x8b\x01'
+    b'\x94\x01\x9c\x01\xa6\x01\xaf\x01\xb8\x01\xc1\x01\xcb\x01\xd5\x01'
+    b'\xdf\x01\xe9\x01\xf3\x01\xfd\x01\x07\x02\x12\x02\x1d\x02\x27\x02'
+    b'\x32\x02\x3e\x02\x49\x02\x54\x02\x60\x02\x6b\x02\x77\x02\x83\x02'
+    b'\x8f\x02\x9c\x02\xa8\x02\xb5\x02\xc2\x02\xce\x02\xdc\x02\xe9\x02'
+    b'\xf6\x02\x04\x03\x11\x03\x1f\x03\x2d\x03\x3c\x03\x4a\x03\x58\x03'
+    b'\x67\x03\x76\x03\x85\x03\x94\x03\xa4\x03\xb3\x03\xc3\x03\xd3\x03'
+    b'\xe3\x03\xf3\x03\x04\x04\x14\x04\x25\x04\x36\x04\x47\x04\x58\x04'
+    b'\x6a\x04\x7b\x04\x8d\x04\x9f\x04\xb2\x04\xc4\x04\xd7\x04\xe9\x04'
+    b'\xfc\x04\x0f\x05\x23\x05\x36\x05\x4a\x05\x5e\x05\x72\x05\x86\x05'
+    b'\x9b\x05\xb0\x05\xc5\x05\xda\x05\xef\x05\x05\x06\x1a\x06\x30\x06'
+    b'\x46\x06\x5d\x06\x73\x06\x8a\x06\xa1\x06\xb8\x06\xcf\x06\xe7\x06'
+    b'\xff\x06\x17\x07\x2f\x07\x47\x07\x60\x07\x79\x07\x92\x07\xab\x07'
+    b'\xc5\x07\xdf\x07\xf9\x07\x13\x08\x2d\x08\x48\x08\x63\x08\x7e\x08'
+    b'\x99\x08\xb5\x08\xd0\x08\xec\x08\x09\x09\x25\x09\x42\x09\x5f\x09'
+    b'\x7c\x09\x99\x09\xb7\x09\xd5\x09\xf3\x09\x11\x0a\x30\x0a\x4f\x0a'
+    b'\x6e\x0a\x8d\x0a\xac\x0a\xcc\x0a\xec\x0a\x0d\x0b\x2d\x0b\x4e\x0b'
+    b'\x6f\x0b\x90\x0b\xb2\x0b\xd4\x0b\xf6\x0b\x18\x0c\x3a\x0c\x5d\x0c'
+    b'\x80\x0c\xa4\x0c\xc7\x0c\xeb\x0c\x0f\x0d\x34\x0d\x58\x0d\x7d\x0d'
+    b'\xa2\x0d\xc8\x0d\xed\x0d\x13\x0e\x3a\x0e\x60\x0e\x87\x0e\xae\x0e'
+    b'\xd5\x0e\xfd\x0e\x25\x0f\x4d\x0f\x75\x0f\x9e\x0f\xc7\x0f\xf0\x0f'
+)
@@ -0,0 +1,77 @@
+"""Integer-only color math for the LED effects.
+
+Float operations allocate on MicroPython, so colors are converted with fixed
+point integers only. Intermediate products stay below 2^30 to fit small ints.
+
+Hue is 0..1535 (6 sectors of 256), saturation and value are 8.8 fixed point
+numbers in 0..SV_MAX, i.e. the integer part is the familiar 0..255 range:
+
+>>> colormath.hsv2rgb(512, colormath.SV_MAX, 128 << 8)
+(0, 128, 0)
+
+Interpolation factors are 0..T_ONE (1.0).
+"""
+
+HUE_MAX = 1536
+SV_MAX = 255 << 8
+T_ONE = 1024
+
+def hsv2rgb(h, s, v):
+    """Returns 8-bit (r, g, b) of hue 0..1535 and 8.8 saturation/value."""
+
+    # k is the channel level relative to v in 0..255*255
+    v12 = v >> 4
+    s8 = s >> 8
+    sector = h >> 8
+    f = h & 0xff
+
+    c = (v12 * 65025 + 520200) // 1040400
+    p = (v12 * 255 * (255 - s8) + 520200) // 1040400
+    if sector & 1:
+        x = (v12 * (65025 - ((s8 * 255 * f) >> 8)) + 520200) // 1040400
+    else:
+        x = (v12 * (65025 - ((s8 * 255 * (256 - f)) >> 8)) + 520200) // 1040400
+
+    if sector == 0:
+        return c, x, p
+    elif sector == 1:
+        return x, c, p
+    elif sector == 2:
+        return p, c, x
+    elif sector == 3:
+        return p, x, c
+    elif sector == 4:
+        return x, p, c
+    return c, p, x
+
+def rgb2hsv(r, g, b):
+    """Returns (hue 0..1535, 8.8 saturation, 8.8 value) of 8-bit r, g, b."""
+
+    maxc = max(r, g, b)
+    minc = min(r, g, b)
+    v = maxc << 8
+
+    if minc == maxc:
+        return 0, 0, v
+
+    d = maxc - minc
+    s = (d * SV_MAX + (maxc >> 1)) // maxc
+
+    if r == maxc:
+        h = ((g - b) * 256 + (d >> 1)) // d
+    elif g == maxc:
+        h = 512 + ((b - r) * 256 + (d >> 1)) // d
+    else:
+        h = 1024 + ((r - g) * 256 + (d >> 1)) // d
+
+    return h % HUE_MAX, s, v
+
+def lerp(a, b, t):
+    """Interpolates between a and b, t is 0..T_ONE."""
+
+    return a + (((b - a) * t) >> 10)
+
+def scale(c, k):
+    """Scales c by brightness k in 0..T_ONE."""
+
+    return (c * k) >> 10
@@ -0,0 +1,423 @@
+# -----------------------------------------------------------------------------
+# imports
+
+import utime
+import random
+import colormath
+import rgbled
+
+# -----------------------------------------------------------------------------
+# registry
+
+# An effect is a class with a name, the defaults of its params and
+#   setup(params)         validates and applies params, called on every switch
+#   set_color(color)      the base color changed (ignored by most effects)
+#   render(frame_buf, t)  draws the frame for time t (ticks_ms) into the frame
+#                         values, returns True if they changed
+# Frame values are in the strip's color order and CIE corrected to the frame
+# depth (see rgbled.strip_frame()). frame_buf is a memoryview spanning only
+# the pixels the effect owns, the color it currently shows is kept in shown.
+# Owners keep their instances, so switching back to an effect resumes it with
+# its tables already built.
+
+_effects = {}
+_names = []
+
+def register(cls):
+    # Class decorator, effects are listed in registration order
+
+    _effects[cls.name] = cls
+    _names.append(cls.name)
+    return cls
+
+def names():
+
+    return _names
+
+def create(name, shown = None):
+    # Raises KeyError for an unknown effect
+
+    return _effects[name](shown)
+
+def describe(instances):
+    # Effects with their params for discovery by clients, those of the
+    # instances (name -> effect) that exist, the defaults of the others
+
+    return [{'name': name, 'params': instances[name].params if name in instances else _effects[name].defaults}
+            for name in _names]
+
+# -----------------------------------------------------------------------------
+# params
+
+# base colors of the palette param
+palettes = {
+    'fire': (217, 109, 0),
+    'candle': (255, 147, 41),
+    'ice': (40, 120, 255),
+    'toxic': (90, 220, 0)
+}
+
+# speed is in percent of the effect's default speed, intensity in percent
+_param_ranges = {
+    'speed': (10, 1000),
+    'intensity': (0, 100)
+}
+
+def _check_param(name, value):
+
+    if name == 'palette':
+        if value not in palettes:
+            raise ValueError(name)
+        return
+
+    (lo, hi) = _param_ranges[name]
+    if not isinstance(value, int) or value < lo or value > hi:
+        raise ValueError(name)
+
+class Effect:
+
+    name = None
+    defaults = {}
+
+    def __init__(self, shown = None):
+
+        self.params = dict(self.defaults)
+        self.shown = bytearray(3) if shown is None else shown
+        self._last_t = None
+
+    def setup(self, params):
+        # Params are validated before any is applied
+
+        for name in params:
+            if name not in self.params:
+                raise ValueError(name)
+            _check_param(name, params[name])
+
+        self.params.update(params)
+        # a paused effect resumes where it stopped
+        self._last_t = None
+
+    def set_color(self, color):
+
+        pass
+
+    def render(self, frame_buf, t):
+
+        return False
+
+    def _dt(self, t):
+        # Milliseconds since the previous frame, 0 on the first one
+
+        last = self._last_t
+        self._last_t = t
+        return 0 if last is None else utime.ticks_diff(t, last)
+
+    def _scaled(self, ms):
+        # Duration ms at the current speed
+
+        return max(1, ms * 100 // self.params['speed'])
+
+# -----------------------------------------------------------------------------
+# color
+
+# easing curves map progress 0..colormath.T_ONE to 0..colormath.T_ONE
+def ease_linear(p):
+
+    return p
+
+def ease_in_out(p):
+
+    return (p * p * (3072 - 2 * p)) >> 20
+
+@register
+class ColorEffect(Effect):
+    # Fades to each new color. A fade started while another one runs continues
+    # from the color currently shown, so there is no jump mid-fade. It is
+    # linear and lasts only as long as the time since the previous color, a
+    # stream of colors (e.g. over the websocket) is followed at its own pace
+    # instead of restarting a slow eased fade with every color.
+
+    name = 'color'
+    defaults = {'speed': 100}
+    duration_ms = 400
+
+    def __init__(self, shown = None):
+
+        super().__init__(shown)
+        self.easing = ease_in_out
+        self._ease = ease_in_out
+        self._from = bytearray(3)
+        self._to = bytearray(3)
+        self._last = [0, 0, 0]
+        self._start_ms = 0
+        self._duration_ms = 0
+        self._running = False
+        self._dirty = False
+
+    def set_color(self, color):
+
+        now = utime.ticks_ms()
+        duration = self._scaled(self.duration_ms)
+        if self._running:
+            self._ease = ease_linear
+            duration = max(1, min(duration, utime.ticks_diff(now, self._start_ms)))
+        else:
+            self._ease = self.easing
+
+        self._from[:] = self.shown
+        self._to[:] = color
+        self._start_ms = now
+        self._duration_ms = duration
+        self._running = True
+        # other effects may have drawn since the last frame
+        self._dirty = True
+
+    def render(self, frame_buf, t):
+        # Frames that look the same after CIE correction as the previous one
+        # are skipped
+
+        if not self._running:
+            return False
+
+        # t may be sampled just before the fade started
+        elapsed = max(0, utime.ticks_diff(t, self._start_ms))
+        if elapsed >= self._duration_ms:
+            p = colormath.T_ONE
+            self._running = False
+        else:
+            p = self._ease((elapsed << 10) // self._duration_ms)
+
+        src = self._from
+        dst = self._to
+        r = colormath.lerp(src[0], dst[0], p)
+        g = colormath.lerp(src[1], dst[1], p)
+        b = colormath.lerp(src[2], dst[2], p)
+        shown = self.shown
+        shown[0] = r
+        shown[1] = g
+        shown[2] = b
+
+        cie = rgbled.strip_cie_lut()[0]
+        out = self._last
+        r, g, b = cie[r], cie[g], cie[b]
+        if not self._dirty and r == out[0] and g == out[1] and b == out[2]:
+            return False
+
+        self._dirty = False
+        out[0] = r
+        out[1] = g
+        out[2] = b
+        _fill(frame_buf, rgbled.frame_pixel(out))
+        return True
+
+def _fill(frame_buf, pixel):
+
+    bpp = len(pixel)
+    for i in range(bpp):
+        c = pixel[i]
+        for j in range(i, len(frame_buf), bpp):
+            frame_buf[j] = c
+
+# -----------------------------------------------------------------------------
+# breathe
+
+@register
+class BreatheEffect(Effect):
+    # Runs on 8.8 fixed point value (see colormath), the value moves by
+    # step_per_mille of the max (rising) or min (falling) value per step_ms.
+    # Intensity is how far the value falls below the color's own value.
+
+    name = 'breathe'
+    defaults = {'speed': 100, 'intensity': 50}
+    step_per_mille = 2
+    step_ms = 4
+
+    def __init__(self, shown = None):
+
+        super().__init__(shown)
+        self._hsv = (0, 0, 0)
+        self._max_value = 0
+        self._min_value = 0
+        self._value = 0
+        self._rising = True
+        self._dither = 0
+
+    def setup(self, params):
+
+        super().setup(params)
+        self._update_range()
+
+    def set_color(self, color):
+
+        self.shown[:] = color
+        self._hsv = colormath.rgb2hsv(color[0], color[1], color[2])
+        self._update_range()
+        self._value = self._min_value
+        self._rising = True
+
+    def _update_range(self):
+
+        self._max_value = self._hsv[2]
+        self._min_value = colormath.scale(self._max_value, colormath.T_ONE - self.params['intensity'] * colormath.T_ONE // 100)
+        self._value = max(self._min_value, min(self._max_value, self._value))
+
+    def render(self, frame_buf, t):
+
+        dt = self._dt(t)
+
+        if self._value <= self._min_value:
+            self._rising = True
+        elif self._value >= self._max_value:
+            self._rising = False
+
+        scale = self.step_per_mille * dt * self.params['speed'] // 100
+        if self._rising:
+            step = max(1, scale * self._max_value // (1000 * self.step_ms))
+            self._value = min(self._max_value, self._value + step)
+        else:
+            step = max(1, scale * self._min_value // (1000 * self.step_ms))
+            self._value = max(self._min_value, self._value - step)
+
+        # using temporal dithering to minimize flicker at low light intensity,
+        # at 8 bits depth only, the strip's dithering stage does it otherwise
+        luts = rgbled.strip_cie_lut()
+        self._dither = (self._dither + 1) % len(luts)
+
+        (r, g, b) = colormath.hsv2rgb(self._hsv[0], self._hsv[1], self._value)
+        lut = luts[self._dither]
+        _fill(frame_buf, rgbled.frame_pixel((lut[r], lut[g], lut[b])))
+        return True
+
+# -----------------------------------------------------------------------------
+# fire
+
+@register
+class FireEffect(Effect):
+    # Picks one of the precomputed flicker levels per pixel, a frame of
+    # random bytes is drawn at once and mapped to levels by a table.
+    # Intensity is the flicker depth, flames flicker every 10 - 50 ms at 100%
+    # speed.
+
+    name = 'fire'
+    defaults = {'speed': 100, 'intensity': 50, 'palette': 'fire'}
+
+    def __init__(self, shown = None):
+
+        super().__init__(shown)
+        self._palette = None
+        self._palette_key = None
+        self._map = None
+        self._noise = None
+        self._wait_ms = 0
+
+    def _build(self):
+
+        cie = rgbled.strip_cie_lut()[0]
+        rgb = palettes[self.params['palette']]
+        levels = self.params['intensity'] + 1
+
+        self._palette = rgbled.new_frame(0)
+        for flicker in range(levels):
+            self._palette.extend(rgbled.frame_pixel(tuple(cie[x - flicker] if x - flicker >= 0 else 0 for x in rgb)))
+
+        self._map = bytes((x * levels) >> 8 for x in range(256))
+
+    def setup(self, params):
+
+        super().setup(params)
+        # tables are rebuilt only if what they depend on changed
+        key = (self.params['palette'], self.params['intensity'])
+        if key != self._palette_key:
+            self._palette_key = key
+            self._palette = None
+
+    def render(self, frame_buf, t):
+
+        if self._palette is None:
+            self._build()
+
+        self._wait_ms -= self._dt(t)
+        if self._wait_ms > 0:
+            return False
+        self._wait_ms = self._scaled(random.randint(10, 50))
+
+        bpp = rgbled.strip_bpp()
+        noise = self._noise
+        if noise is None or len(noise) * bpp != len(frame_buf):
+            noise = self._noise = bytearray(len(frame_buf) // bpp)
+        random.fill(noise, 0, 255)
+
+        palette = self._palette
+        fire_map = self._map
+        j = 0
+
+        for i in range(0, len(frame_buf), bpp):
+            o = fire_map[noise[j]] * bpp
+            frame_buf[i] = palette[o]
+            frame_buf[i + 1] = palette[o + 1]
+            frame_buf[i + 2] = palette[o + 2]
+            j += 1
+        return True
+
+# -----------------------------------------------------------------------------
+# rainbow
+
+@register
+class RainbowEffect(Effect):
+    # Frames are precomputed once per strip length: the hue wheel is sampled
+    # at leds * sub_steps points and sub-frame j holds samples j, j + sub_steps,
+    # ... for two turns of the wheel. Any rotation of the rainbow is then a
+    # contiguous slice of one sub-frame, copied into the frame in one go.
+
+    name = 'rainbow'
+    defaults = {'speed': 100}
+    step_ms = 20
+
+    def __init__(self, shown = None):
+
+        super().__init__(shown)
+        self._frames = None
+        self._frame_size = 0
+        self._sub_steps = 1
+        self._samples = 1
+        self._offset = 0
+        self._elapsed_ms = 0
+
+    def _build(self, frame_size):
+
+        cie = rgbled.strip_cie_lut()[0]
+        leds = frame_size // rgbled.strip_bpp()
+
+        # ~1 degree of hue per frame, like the per-pixel version did
+        self._sub_steps = sub_steps = max(1, 360 // leds)
+        self._samples = samples = leds * sub_steps
+
+        sv = colormath.SV_MAX
+        hue_lut = [rgbled.frame_pixel(tuple(cie[x] for x in colormath.hsv2rgb(colormath.HUE_MAX * i // samples, sv, sv)))
+                   for i in range(samples)]
+
+        self._frames = []
+        for j in range(sub_steps):
+            frame = rgbled.new_frame(0)
+            for k in range(2 * leds):
+                frame.extend(hue_lut[(j + sub_steps * k) % samples])
+            self._frames.append(memoryview(frame))
+
+        self._frame_size = frame_size
+        self._offset %= samples
+
+    def render(self, frame_buf, t):
+
+        size = len(frame_buf)
+        if size != self._frame_size:
+            self._build(size)
+
+        (start, j) = divmod(self._offset, self._sub_steps)
+        start *= rgbled.strip_bpp()
+        frame_buf[0:size] = self._frames[j][start:start + size]
+
+        # advance one hue sample per step_ms
+        self._elapsed_ms += self._dt(t)
+        (steps, self._elapsed_ms) = divmod(self._elapsed_ms, self._scaled(self.step_ms))
+        self._offset = (self._offset + steps) % self._samples
+        return True
@@ -2,8 +2,13 @@
 # imports
 
 import os
+import time
+import utime
 import network
+import array
+import hashlib
 import binascii
+import metrics
 import uasyncio as asyncio
 
 # -----------------------------------------------------------------------------
@@ -23,64 +28,312 @@ _log = _logger if _log_enabled else lambda *args, **kwargs: None
 
 _wifi_ssid = None
 _wifi_pwd = None
+_server_header = b''
 
 def init(wifi_ssid, wifi_pwd):
 
     global _wifi_ssid
     global _wifi_pwd
+    global _server_header
 
     _wifi_ssid = wifi_ssid
     _wifi_pwd = wifi_pwd
 
+    # server identity does not change at runtime, render it once
+    uname = os.uname()
+    _server_header = 'Server: {}, MicroPython {}\r\n'.format(uname.machine, uname.version).encode()
+
 # -----------------------------------------------------------------------------
 # authentication
 
 _basic_auth_enabled = False
-_usr_name = None
-_usr_pwd = None
+_auth_token = b''
 
-def enable_basic_auth(usr_name, usr_pwd):
+def enable_basic_auth(usr_name, usr_pwd, session_s = 0):
+    # The expected credentials are encoded once here, requests are checked by
+    # comparing the raw header value. With session_s > 0 a successful login
+    # also sets a signed session cookie valid for session_s seconds.
 
-    global _basic_auth_enabled
-    global _usr_name, _usr_pwd
+    global _basic_auth_enabled, _auth_token
 
     _basic_auth_enabled = True
-    _usr_name = usr_name
-    _usr_pwd = usr_pwd
+    _auth_token = binascii.b2a_base64('{}:{}'.format(usr_name, usr_pwd).encode())[:-1]
+    _enable_sessions(session_s)
+
+def _equals(a, b):
+    # Constant time comparison, the time only depends on the length of b
+
+    return _equals_at(a, 0, len(a), b)
+
+def _equals_at(buf, start, end, b):
+    # _equals of buf[start:end] and b without slicing buf
+
+    diff = (end - start) ^ len(b)
+    if diff:
+        # compare b with itself, a wrong length takes as long
+        buf = b
+        start = 0
+    for c in b:
+        diff |= buf[start] ^ c
+        start += 1
+    return diff == 0
+
+def _authenticate(req):
+    # Checks the Authorization header, e.g. b'Basic YWRtaW46c2VjcmV0', in the
+    # request buffer. Returns None if the request has none.
+
+    n = req._find(b'authorization')
+    if n < 0:
+        return None
+
+    buf = req.buf
+    start = req.headers[n]
+    end = req.headers[n + 1]
+    if end - start < 6 or buf[start + 5] != 0x20:
+        return False
+    for c in range(5):
+        if buf[start + c] | 0x20 != b'basic'[c]:
+            return False
+
+    start += 6
+    while start < end and buf[start] == 0x20:
+        start += 1
+    return _equals_at(buf, start, end, _auth_token)
+
+# sessions: the cookie value is the hex expiry time and an HMAC-SHA256 of it,
+# keyed with a secret drawn at boot, so a reboot ends every session. The
+# newest cookies issued or verified are kept as (b'expiry.', mac, expiry) and
+# compared as they are, the HMAC is only computed for cookies not among them.
+# The expiry is no secret, only the mac is compared in constant time.
+_session_s = 0
+_session_cookie = b'sid='
+_session_ipad = None
+_session_opad = None
+_sessions = []
+_max_sessions = 4
 
-def _authenticate(authorization_header):
+def _enable_sessions(session_s):
 
-    header = authorization_header.split(' ')
-    if len(header) != 3:
+    global _session_s, _session_ipad, _session_opad
+
+    _session_s = session_s
+    _sessions.clear()
+    if session_s:
+        key = os.urandom(32) + bytes(32)
+        _session_ipad = bytes(b ^ 0x36 for b in key)
+        _session_opad = bytes(b ^ 0x5c for b in key)
+
+def _session_mac(expiry):
+    # hmac is not available on MicroPython, this is HMAC-SHA256 by the book
+
+    inner = hashlib.sha256(_session_ipad)
+    inner.update(expiry)
+    outer = hashlib.sha256(_session_opad)
+    outer.update(inner.digest())
+    return binascii.hexlify(outer.digest()[:16])
+
+def _remember_session(prefix, mac, expiry):
+
+    if len(_sessions) >= _max_sessions:
+        _sessions.pop()
+    _sessions.insert(0, (prefix, mac, expiry))
+
+def _new_session():
+    # Returns the Set-Cookie header of a new session
+
+    expiry = int(time.time()) + _session_s
+    prefix = b'%x.' % expiry
+    mac = _session_mac(prefix[:-1])
+    _remember_session(prefix, mac, expiry)
+    return b'Set-Cookie: %s%s%s; Max-Age=%d; Path=/; HttpOnly; SameSite=Strict\r\n' % (
+        _session_cookie, prefix, mac, _session_s)
+
+def _valid_session(req):
+    # Checks the session cookie in the request buffer
+
+    n = req._find(b'cookie')
+    if n < 0:
         return False
 
-    (type, credentials) = header[1:3]
+    buf = req.buf
+    first = req.headers[n]
+    end = req.headers[n + 1]
+    start = first
+    while True:
+        start = buf.find(_session_cookie, start, end)
+        if start < 0:
+            return False
+        if start == first or buf[start - 1] == 0x20 or buf[start - 1] == 0x3b:
+            break
+        start += 1
 
-    if type != 'Basic':
+    start += len(_session_cookie)
+    stop = buf.find(b';', start, end)
+    if stop < 0:
+        stop = end
+
+    dot = buf.find(b'.', start, stop)
+    if dot < 0:
         return False
 
-    (username, password) = binascii.a2b_base64(credentials).decode().split(':')
-    _log('username: ', username)
-    _log('password: ', password)
+    for (prefix, mac, expiry) in _sessions:
+        if (dot + 1 - start == len(prefix) and buf.find(prefix, start, dot + 1) == start
+                and _equals_at(buf, dot + 1, stop, mac)):
+            return expiry > time.time()
+
+    prefix = bytes(buf[start:dot + 1])
+    try:
+        expiry = int(prefix[:-1], 16)
+    except ValueError:
+        return False
+    mac = _session_mac(prefix[:-1])
+    if expiry <= time.time() or not _equals_at(buf, dot + 1, stop, mac):
+        return False
+
+    _remember_session(prefix, mac, expiry)
+    return True
+
+# failed logins: after auth_max_failures a client gets 429 until auth_block_s
+# have passed since its first failure
+auth_max_failures = 5
+auth_block_s = 60
+
+_auth_max_clients = 8
+# client address -> [failures, ticks_ms of the first failure]
+_auth_failures = {}
+
+def _auth_blocked(addr):
+
+    entry = _auth_failures.get(addr)
+    if entry is None:
+        return False
+
+    if utime.ticks_diff(utime.ticks_ms(), entry[1]) >= auth_block_s * 1000:
+        del _auth_failures[addr]
+        return False
+
+    return entry[0] >= auth_max_failures
+
+def _auth_failed(addr):
+
+    entry = _auth_failures.get(addr)
+    if entry is not None:
+        entry[0] += 1
+        return
+
+    # forget the client that failed first to bound the table
+    if len(_auth_failures) >= _auth_max_clients:
+        now = utime.ticks_ms()
+        oldest = None
+        age = -1
+        for (a, e) in _auth_failures.items():
+            if utime.ticks_diff(now, e[1]) > age:
+                oldest = a
+                age = utime.ticks_diff(now, e[1])
+        del _auth_failures[oldest]
+
+    _auth_failures[addr] = [1, utime.ticks_ms()]
+
+def _check_auth(conn):
+    # Returns 200 if the request may pass, 401 or 429 otherwise
+
+    req = conn.request
+
+    if _session_s and _valid_session(req):
+        return 200
+
+    if _auth_blocked(conn.addr):
+        _counters[_AUTH_BLOCKED] += 1
+        return 429
+
+    valid = _authenticate(req)
+    if valid is None:
+        return 401
 
-    return username == _usr_name and password == _usr_pwd
+    if not valid:
+        _counters[_AUTH_FAILURES] += 1
+        _auth_failed(conn.addr)
+        return 401
+
+    _auth_failures.pop(conn.addr, None)
+    if _session_s:
+        conn.extra_header = _new_session()
+    return 200
 
 # -----------------------------------------------------------------------------
 # handlers
 
-_handlers = {}
+# Exact paths map to a route in a dict, paths with <param> segments are compiled
+# when registered and grouped by their segment count. A route is a list of
+# [{method: callback}, pre-rendered 405 header or None, metrics index].
+_routes = {}
+_pattern_routes = {}
 _not_found_handler = None
 
+def _normalize(path):
+
+    return path[:-1] if len(path) > 1 and path[-1] == '/' else path
+
 def _add_handler(method, url, callback):
 
-    global _handlers
+    global _routes, _pattern_routes
+
+    path = _normalize(url)
+
+    if '<' not in path:
+        route = _routes.get(path)
+        if route is None:
+            route = _routes[path] = [{}, None, _add_route_metrics(path)]
+    else:
+        segments = tuple(None if s[:1] == '<' and s[-1:] == '>' else s for s in path.split('/'))
+        names = tuple(s[1:-1] for s in path.split('/') if s[:1] == '<' and s[-1:] == '>')
+        patterns = _pattern_routes.setdefault(len(segments), [])
+        route = None
+        for (p_segments, p_names, p_route) in patterns:
+            if p_segments == segments and p_names == names:
+                route = p_route
+        if route is None:
+            route = [{}, None, _add_route_metrics(path)]
+            patterns.append((segments, names, route))
+
+    route[0][method] = callback
+    route[1] = None
+
+def _find_route(path):
+    # Returns (route, path params) or (None, None), the params are percent
+    # decoded. Raises ValueError if one does not decode as UTF-8.
+
+    route = _routes.get(path)
+    if route is not None:
+        return (route, None)
+
+    parts = path.split('/')
+    for (segments, names, route) in _pattern_routes.get(len(parts), ()):
+        params = None
+        for i in range(len(parts)):
+            if segments[i] is None:
+                if not parts[i]:
+                    break
+                if params is None:
+                    params = {}
+                params[names[len(params)]] = _unquote(parts[i], False)
+            elif segments[i] != parts[i]:
+                break
+        else:
+            return (route, params)
+
+    return (None, None)
+
+def _method_not_allowed_header(route):
 
-    if method not in _handlers:
-        _handlers[method] = {}
-    _handlers[method][url] = callback
+    if route[1] is None:
+        allow = ', '.join(sorted(route[0]))
+        route[1] = create_header({ 'Allow': allow, 'Content-Length': '0' }, 405)
+    return route[1]
 
 def handle(method, url):
-    # Decorator for add_handler
+    # Decorator for add_handler, url may contain <name> segments which are
+    # passed to the handler in conn.params
     def _handle(f):
         _add_handler(method, url, f)
         return f
@@ -97,82 +350,1211 @@ def not_found():
 # -----------------------------------------------------------------------------
 # utils
 
+_status_reasons = {
+    101: 'Switching Protocols',
+    200: 'OK',
+    204: 'No Content',
+    304: 'Not Modified',
+    400: 'Bad Request',
+    401: 'Unauthorized',
+    404: 'Not Found',
+    405: 'Method Not Allowed',
+    408: 'Request Timeout',
+    413: 'Content Too Large',
+    429: 'Too Many Requests',
+    431: 'Request Header Fields Too Large',
+    501: 'Not Implemented',
+    503: 'Service Unavailable'
+}
+
 def create_header(headers, status):
- 
-    header = 'HTTP/1.1 {} OK\r\n Server: {}, Micropython {}\r\n'.format(str(status), getattr(os.uname(), 'machine'), getattr(os.uname(), 'version'))
+    # Renders status line and headers to bytes, intended to be called once per
+    # response type (e.g. when a handler is registered) and reused afterwards
+
+    header = ['HTTP/1.1 {} {}\r\n'.format(status, _status_reasons.get(status, ''))]
 
     for name in headers:
-        header += '{}: {}\r\n'.format(name, headers[name])
+        header.append('{}: {}\r\n'.format(name, headers[name]))
+
+    return ''.join(header).encode()
+
+_days = ('Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun')
+_months = ('Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec')
+
+def _unquote(s, form = True):
+    # Decodes percent escapes, and '+' as space in query strings (form) but
+    # not in paths. Raises ValueError if the result is not UTF-8.
+
+    if '%' not in s and (not form or '+' not in s):
+        return s
+
+    if form:
+        s = s.replace('+', ' ')
+    parts = s.split('%')
+    out = bytearray(parts[0].encode())
+    for part in parts[1:]:
+        try:
+            out.append(int(part[:2], 16))
+            out.extend(part[2:].encode())
+        except ValueError:
+            out.extend(b'%' + part.encode())
+    return out.decode()
+
+# conn.query of requests without a query string, shared so they don't
+# allocate one each, handlers must not modify it
+_no_query = {}
+
+def parse_query(query):
+    # Parses 'a=1&b=x%20y' into {'a': '1', 'b': 'x y'}, last value wins.
+    # Raises ValueError like _unquote.
+
+    params = {}
+    for pair in query.split('&'):
+        if pair:
+            i = pair.find('=')
+            if i < 0:
+                params[_unquote(pair)] = ''
+            else:
+                params[_unquote(pair[:i])] = _unquote(pair[i + 1:])
+    return params
+
+def http_date(seconds):
+    # Formats seconds since the (port specific) epoch as IMF-fixdate
+
+    t = time.gmtime(seconds)
+    return '{}, {:02d} {} {} {:02d}:{:02d}:{:02d} GMT'.format(_days[t[6]], t[2], _months[t[1] - 1], t[0], t[3], t[4], t[5])
+
+def send_header(conn, header, content_length = None):
+
+    conn.write(header)
+    if content_length is not None:
+        conn.write(b'Content-Length: %d\r\n' % content_length)
+    conn.write(_server_header)
+    if conn.extra_header:
+        conn.write(conn.extra_header)
+        conn.extra_header = None
+    conn.write(_keep_alive_header if conn.keep_alive else _close_header)
+
+# -----------------------------------------------------------------------------
+# connections
+
+_keep_alive_timeout_s = 5
+_keep_alive_max_requests = 20
+
+_keep_alive_header = b'Connection: keep-alive\r\n\r\n'
+_close_header = b'Connection: close\r\n\r\n'
+
+def set_keep_alive(timeout_s, max_requests):
+
+    global _keep_alive_timeout_s, _keep_alive_max_requests
+
+    _keep_alive_timeout_s = timeout_s
+    _keep_alive_max_requests = max_requests
+
+# Every connection holds a task and a request buffer, so connections beyond
+# the limits are answered with 503 right away, unless a keep-alive connection
+# idle between requests can be closed to make room (the one idle the longest).
+# A request has to arrive within _header_timeout_s (start line and headers)
+# and _body_timeout_s. Event streams and websockets stay open for as long as
+# the page does, begin_stream() moves them from the request limits to
+# _max_streams.
+_max_connections = 5
+_max_connections_per_ip = 4
+_max_streams = 3
+_header_timeout_s = 5
+_body_timeout_s = 5
+
+# client address -> open connections
+_connections_per_ip = {}
+# connections serving requests
+_connections = []
+
+connections_active = 0
+connections_rejected = 0
+connections_timed_out = 0
+connections_evicted = 0
+streams_active = 0
+
+def set_connection_limits(max_connections, max_per_ip, header_timeout_s, body_timeout_s, max_streams = 3):
+
+    global _max_connections, _max_connections_per_ip, _header_timeout_s, _body_timeout_s, _max_streams
+
+    _max_connections = max_connections
+    _max_connections_per_ip = max_per_ip
+    _header_timeout_s = header_timeout_s
+    _body_timeout_s = body_timeout_s
+    _max_streams = max_streams
+
+def _admit(addr):
+    # Returns False if the connection exceeds a limit
+
+    global connections_active, connections_rejected
+
+    count = _connections_per_ip.get(addr, 0)
+    if connections_active >= _max_connections or count >= _max_connections_per_ip:
+        # over the per address limit only a connection of that address helps
+        if not _evict_idle(addr if count >= _max_connections_per_ip else None):
+            connections_rejected += 1
+            return False
 
-    # Server does not support persistent connections
-    header += 'Connectrion: close\r\n\r\n'
+    connections_active += 1
+    _connections_per_ip[addr] = count + 1
+    return True
+
+def _evict_idle(addr):
+    # Cancels the connection of addr (any if None) idle the longest, returns
+    # False if none is idle. Its slot is given away at once, the limits are
+    # exceeded by one until it has closed.
+
+    global connections_evicted
+
+    now = utime.ticks_ms()
+    victim = None
+    for conn in _connections:
+        if conn.idle_since is None or (addr is not None and conn.addr != addr):
+            continue
+        if victim is None or utime.ticks_diff(now, conn.idle_since) > utime.ticks_diff(now, victim.idle_since):
+            victim = conn
+
+    if victim is None:
+        return False
+
+    _log('closing idle connection of', victim.addr)
+    connections_evicted += 1
+    victim.idle_since = None
+    victim.task.cancel()
+    return True
+
+def _release(addr):
+
+    global connections_active
+
+    connections_active -= 1
+    count = _connections_per_ip[addr] - 1
+    if count:
+        _connections_per_ip[addr] = count
+    else:
+        del _connections_per_ip[addr]
+
+def begin_stream(conn):
+    # Called by handlers keeping the connection open (event streams), returns
+    # False if _max_streams are open already
+
+    global streams_active, connections_rejected
+
+    if streams_active >= _max_streams:
+        connections_rejected += 1
+        return False
+
+    streams_active += 1
+    conn.stream = True
+    _connections.remove(conn)
+    _release(conn.addr)
+    return True
+
+class _Connection:
+
+    def __init__(self, reader, writer, addr = None):
+
+        self.reader = reader
+        self.writer = writer
+        self.addr = addr
+        self.request = _Request(reader)
+        self.keep_alive = True
+        self.requests = 0
+        self.params = None
+        self.query = None
+        # sent with the next response header, e.g. Set-Cookie
+        self.extra_header = None
+        # ticks_ms since the connection waits for its next request, else None
+        self.idle_since = None
+        self.stream = False
+        self.task = None
+
+    def write(self, data):
+
+        _counters[_BYTES_SENT] += len(data)
+        self.writer.write(data)
+
+    async def drain(self):
+
+        await self.writer.drain()
+
+# -----------------------------------------------------------------------------
+# request parsing
+
+_max_start_line = 256
+_max_headers = 32
+_max_header_size = 1024
+_max_body = 512
+
+def set_request_limits(max_start_line, max_headers, max_header_size, max_body):
+
+    global _max_start_line, _max_headers, _max_header_size, _max_body
+
+    _max_start_line = max_start_line
+    _max_headers = max_headers
+    _max_header_size = max_header_size
+    _max_body = max_body
+
+# parse results, anything else is a HTTP status code to reply with
+_PARSE_OK = 0
+_PARSE_EOF = -1
+
+_methods = ('GET', 'POST', 'PUT', 'DELETE', 'HEAD', 'OPTIONS', 'PATCH')
+_methods_bytes = tuple(m.encode() for m in _methods)
+
+# The headers the server looks up, only their values are kept. A name is
+# matched in place in its usual spelling or in lowercase, other spellings
+# are compared byte by byte. Browsers send many more headers (sec-ch-ua,
+# Sec-Fetch-*, ...), those are skipped and only count against the limits.
+_header_spellings = (b'Content-Length', b'Transfer-Encoding', b'Connection', b'Authorization', b'Cookie',
+                     b'If-None-Match', b'If-Modified-Since', b'Accept-Encoding', b'Upgrade', b'Sec-WebSocket-Key')
+_header_names = tuple(name.lower() for name in _header_spellings)
+# lowercase name -> offset of its (value start, value end) in _Request.headers
+_header_offsets = {}
+# name length -> indexes of the names of that length
+_header_lengths = {}
+
+for _i in range(len(_header_names)):
+    _header_offsets[_header_names[_i]] = 2 * _i
+    _header_lengths[len(_header_names[_i])] = _header_lengths.get(len(_header_names[_i]), ()) + (_i,)
+
+def _same_name(buf, start, name):
+    # Case-insensitive compare of a header name with a lowercase name of the
+    # same length, for spellings that are not matched in place
+
+    for c in range(len(name)):
+        if buf[start + c] | 0x20 != name[c]:
+            return False
+    return True
+
+class _Request:
+    # Parses requests from a single connection into a buffer that is allocated
+    # once and reused by every request on that connection. The values of the
+    # headers in _header_names are kept as offsets into the buffer, so only
+    # the values that are actually used get copied out of it.
+
+    def __init__(self, reader):
+
+        self.reader = reader
+        self.buf = bytearray(_max_header_size + _max_body)
+        self.mv = memoryview(self.buf)
+        self.pos = 0
+        self.end = 0
+        self.eof = False
+        # value start and end per name of _header_names, a start of 0 means
+        # the header is missing (offset 0 is the start line)
+        self.headers = array.array('H', bytes(4 * len(_header_names)))
+        self.method = None
+        self.url = None
+        self.http11 = False
+        self.body = ''
+
+    async def _fill(self):
+
+        if self.end == len(self.buf):
+            return False
+
+        # slicing the view allocates, the whole buffer is free after a compact
+        n = await self.reader.readinto(self.mv[self.end:] if self.end else self.mv)
+        if not n:
+            self.eof = True
+            return False
+
+        self.end += n
+        return True
+
+    def _buffered_line(self, limit):
+        # Returns end offset of the next line if it is in the buffer already,
+        # -2 if it needs more data. Every await allocates a generator on
+        # MicroPython, so lines are only awaited if they are incomplete.
+
+        i = self.buf.find(b'\r\n', self.pos, self.end)
+        if i < 0:
+            return -2
+        return i if i - self.pos <= limit else -1
+
+    async def _line(self, limit):
+        # Returns end offset of the next line or -1 if the line exceeds the limit
+        # or the connection was closed. Keeps the line start at self.pos.
+
+        while True:
+            i = self.buf.find(b'\r\n', self.pos, self.end)
+            if i >= 0:
+                return i if i - self.pos <= limit else -1
+            if self.end - self.pos > limit or not await self._fill():
+                return -1
+
+    def compact(self):
+
+        # move unparsed (pipelined) data to the buffer start
+        if self.pos > 0:
+            size = self.end - self.pos
+            self.mv[0:size] = self.mv[self.pos:self.end]
+            self.pos = 0
+            self.end = size
+
+    async def start_line(self):
+
+        # header offsets stay valid until the next request because nothing
+        # moves in the buffer after the start line was read
+        self.compact()
+
+        i = self._buffered_line(_max_start_line)
+        if i == -2:
+            i = await self._line(_max_start_line)
+        if i < 0:
+            return _PARSE_EOF if self.eof else 400
+
+        buf = self.buf
+        start = self.pos
+        self.pos = i + 2
+
+        sp1 = buf.find(b' ', start, i)
+        sp2 = buf.find(b' ', sp1 + 1, i)
+        if sp1 < 0 or sp2 < 0:
+            return 400
+
+        # known methods are matched in place and mapped to interned strings
+        self.method = None
+        for m in range(len(_methods)):
+            name = _methods_bytes[m]
+            if sp1 - start == len(name) and buf.find(name, start, sp1) == start:
+                self.method = _methods[m]
+                break
+        if self.method is None:
+            return 400
+
+        try:
+            self.url = str(self.mv[sp1 + 1:sp2], 'utf-8')
+        except (UnicodeError, ValueError):
+            return 400
+        self.http11 = i - sp2 - 1 == 8 and buf.find(b'HTTP/1.1', sp2 + 1, i) == sp2 + 1
+
+        return _PARSE_OK
+
+    async def read_headers(self):
+
+        buf = self.buf
+        spans = self.headers
+        for n in range(0, len(spans), 2):
+            spans[n] = 0
+        count = 0
+
+        # _buffered_line inlined, this runs once per header line
+        start = self.pos
+        while True:
+            i = buf.find(b'\r\n', start, self.end)
+            if i < 0:
+                self.pos = start
+                i = await self._line(_max_header_size - start)
+                if i < 0:
+                    return _PARSE_EOF if self.eof else 431
+            if i > _max_header_size:
+                return 431
+
+            line = start
+            start = self.pos = i + 2
+            if i == line:
+                break
+
+            if count == _max_headers:
+                return 431
+            count += 1
+
+            colon = buf.find(b':', line, i)
+            if colon <= line:
+                return 400
+
+            candidates = _header_lengths.get(colon - line)
+            if candidates is None:
+                continue
+            for k in candidates:
+                name = _header_names[k]
+                if (buf.find(_header_spellings[k], line, colon) == line or buf.find(name, line, colon) == line
+                        or (buf[line] | 0x20 == name[0] and _same_name(buf, line, name))):
+                    break
+            else:
+                continue
+
+            # a repeated Content-Length or Transfer-Encoding is refused, a
+            # proxy in front could frame the body differently
+            n = 2 * k
+            if spans[n] and k < 2:
+                return 400
+
+            value = colon + 1
+            while value < i and (buf[value] == 32 or buf[value] == 9):
+                value += 1
+            end = i
+            while end > value and (buf[end - 1] == 32 or buf[end - 1] == 9):
+                end -= 1
+
+            spans[n] = value
+            spans[n + 1] = end
+
+        return _PARSE_OK
+
+    def headers_buffered(self):
+        # True if read_headers won't wait for data, the start line's CRLF
+        # precedes the header section
+
+        return self.buf.find(b'\r\n\r\n', self.pos - 2, self.end) >= 0
+
+    def body_buffered(self):
+        # True if read_body won't wait for data, malformed lengths are refused
+        # at once
+
+        n = self._find(b'content-length')
+        return n < 0 or self._int_value(n) <= self.end - self.pos
+
+    async def read_body(self):
+
+        # bodies are only delimited by Content-Length, a chunked body would be
+        # parsed as the next request
+        if self.has_header(b'transfer-encoding'):
+            return 501
+
+        length = 0
+        n = self._find(b'content-length')
+        if n >= 0:
+            length = self._int_value(n)
+            if length < 0:
+                return 400
+            if length > _max_body:
+                return 413
+
+        # the buffer reserves _max_body bytes behind the header section
+        while self.end - self.pos < length:
+            if not await self._fill():
+                return _PARSE_EOF
+
+        start = self.pos
+        self.pos += length
+        try:
+            self.body = str(self.mv[start:start + length], 'utf-8') if length else ''
+        except (UnicodeError, ValueError):
+            return 400
+        return _PARSE_OK
+
+    def _find(self, name):
+        # Returns the offset of the value span of a name of _header_names
+        # (lowercase) in self.headers or -1 if the request has no such header
+
+        n = _header_offsets[name]
+        return n if self.headers[n] else -1
+
+    def header(self, name):
+        # Returns a copy of the header value (bytes) or None, name must be in
+        # _header_names
+
+        n = self._find(name)
+        return bytes(self.mv[self.headers[n]:self.headers[n + 1]]) if n >= 0 else None
+
+    def has_header(self, name):
+
+        return self._find(name) >= 0
+
+    def header_equals(self, name, value):
+        # Compares a header value in place, without copying it out
+
+        n = self._find(name)
+        if n < 0:
+            return False
+        start = self.headers[n]
+        end = self.headers[n + 1]
+        return end - start == len(value) and self.buf.find(value, start, end) == start
+
+    def header_contains(self, name, value):
+        # Checks (case-sensitive) whether a header value contains value
+
+        n = self._find(name)
+        return n >= 0 and self.buf.find(value, self.headers[n], self.headers[n + 1]) >= 0
+
+    def _int_value(self, n):
+
+        if self.headers[n] == self.headers[n + 1]:
+            return -1
+
+        value = 0
+        buf = self.buf
+        for c in range(self.headers[n], self.headers[n + 1]):
+            if not 48 <= buf[c] <= 57:
+                return -1
+            value = value * 10 + buf[c] - 48
+            # stay a small int, nothing this large is accepted anyway
+            if value > 0xfffffff:
+                return -1
+        return value
+
+    def header_has(self, name, token, spelling = None):
+        # Checks whether a header value contains the lowercase token or its
+        # usual other spelling (e.g. b'Keep-Alive'), the buffer is searched in
+        # place
+
+        n = self._find(name)
+        if n < 0:
+            return False
+
+        start = self.headers[n]
+        end = self.headers[n + 1]
+        return self.buf.find(token, start, end) >= 0 or (spelling is not None and self.buf.find(spelling, start, end) >= 0)
+
+# -----------------------------------------------------------------------------
+# websocket
+
+WS_TEXT = 0x1
+WS_BINARY = 0x2
+WS_CLOSE = 0x8
+WS_PING = 0x9
+WS_PONG = 0xA
+
+_WS_GUID = b'258EAFA5-E914-47DA-95CA-C5AB0DC85B11'
+
+class WebSocket:
+    # RFC 6455 server side of an upgraded connection. Frames are read into the
+    # request buffer of the connection, so a message can't be larger than the
+    # buffer and payloads handed out by recv() are only valid until the next call.
+
+    def __init__(self, conn):
+
+        self.conn = conn
+        self.req = conn.request
+        self.closed = False
+
+    async def _need(self, n):
+
+        req = self.req
+        while req.end - req.pos < n:
+            if req.pos + n > len(req.buf):
+                req.compact()
+            if not await req._fill():
+                return False
+        return True
+
+    async def recv(self):
+        # Returns (opcode, payload memoryview) of the next data frame or None
+        # once the connection is closed. Control frames are handled here.
+
+        req = self.req
+        buf = req.buf
+
+        while not self.closed:
+            if not await self._need(2):
+                self.closed = True
+                break
+
+            opcode = buf[req.pos] & 0x0f
+            fin = buf[req.pos] & 0x80
+            masked = buf[req.pos + 1] & 0x80
+            length = buf[req.pos + 1] & 0x7f
+            header = 2
+
+            if length == 126:
+                if not await self._need(4):
+                    break
+                length = (buf[req.pos + 2] << 8) | buf[req.pos + 3]
+                header = 4
+            elif length == 127:
+                # 64-bit lengths never fit into the buffer
+                await self.close(1009)
+                break
+
+            if not masked:
+                await self.close(1002)
+                break
+
+            if header + 4 + length > len(buf):
+                await self.close(1009)
+                break
+
+            if not await self._need(header + 4 + length):
+                self.closed = True
+                break
+
+            # unmask payload in place
+            mask = req.pos + header
+            start = mask + 4
+            for i in range(length):
+                buf[start + i] ^= buf[mask + (i & 3)]
+            req.pos = start + length
+
+            payload = req.mv[start:start + length]
+
+            if not fin or opcode == 0:
+                # fragmented messages are not supported
+                await self.close(1003)
+            elif opcode == WS_PING:
+                self.send(bytes(payload), WS_PONG)
+                await self.conn.drain()
+            elif opcode == WS_CLOSE:
+                await self.close(1000)
+            elif opcode == WS_TEXT or opcode == WS_BINARY:
+                return (opcode, payload)
+
+        return None
+
+    def send(self, data, opcode = WS_BINARY):
+
+        length = len(data)
+        if length < 126:
+            self.conn.write(bytes((0x80 | opcode, length)))
+        else:
+            self.conn.write(bytes((0x80 | opcode, 126, length >> 8, length & 0xff)))
+        self.conn.write(data)
+
+    async def close(self, code = 1000):
+
+        if not self.closed:
+            self.closed = True
+            self.send(bytes((code >> 8, code & 0xff)), WS_CLOSE)
+            await self.conn.drain()
+
+async def _ws_upgrade(conn, callback):
+
+    req = conn.request
+    key = req.header(b'sec-websocket-key')
+
+    if key is None or not req.header_has(b'upgrade', b'websocket', b'WebSocket'):
+        conn.keep_alive = False
+        send_header(conn, _error_headers[400])
+        return
+
+    if not begin_stream(conn):
+        conn.keep_alive = False
+        send_header(conn, _busy_header)
+        return
+
+    accept = binascii.b2a_base64(hashlib.sha1(key + _WS_GUID).digest())[:-1]
+
+    # the connection belongs to the websocket from now on
+    conn.keep_alive = False
+    conn.write(_ws_upgrade_header)
+    conn.write(b'Sec-WebSocket-Accept: ')
+    conn.write(accept)
+    conn.write(b'\r\n')
+    conn.write(_server_header)
+    conn.write(b'\r\n')
+    await conn.drain()
+
+    ws = WebSocket(conn)
+    try:
+        await callback(ws)
+    finally:
+        await ws.close()
+
+def websocket(url):
+    # Decorator, registers a GET handler upgrading the connection and
+    # passing a WebSocket to the decorated coroutine
+    def _websocket(f):
+        async def _handler(conn, body):
+            await _ws_upgrade(conn, f)
+        _add_handler('GET', url, _handler)
+        return f
+    return _websocket
+
+# -----------------------------------------------------------------------------
+# static files
+
+# Files are streamed through one buffer of _chunk_size bytes shared by all
+# connections, each chunk is taken over by the stream before the next await.
+# The default fills the ESP8266's TCP send buffer (two 1460 byte segments),
+# so every drain() sends full segments. Files up to _cache_max_file bytes are
+# kept in RAM, the least recently used ones are dropped to stay within
+# _cache_budget bytes. Only files of the types in mime_types are served, so
+# sources and credentials never are.
+_chunk_size = 2920
+_cache_budget = 3072
+_cache_max_file = 1024
+
+mime_types = {
+    'html': 'text/html',
+    'js': 'text/javascript',
+    'css': 'text/css',
+    'ico': 'image/x-icon',
+    'png': 'image/png',
+    'jpg': 'image/jpeg',
+    'svg': 'image/svg+xml',
+    'txt': 'text/plain'
+}
+
+_file_buf = None
+_file_view = None
+
+# file -> content, _cache_order lists the files least recently used first
+_cache = {}
+_cache_order = []
+_cache_size = 0
+
+def set_static_limits(chunk_size, cache_budget, cache_max_file):
+    # A cache_budget of 0 disables the cache
+
+    global _chunk_size, _cache_budget, _cache_max_file, _file_buf, _file_view, _cache_size
+
+    _chunk_size = chunk_size
+    _cache_budget = cache_budget
+    _cache_max_file = cache_max_file
+    _file_buf = None
+    _file_view = None
+    _cache.clear()
+    _cache_order.clear()
+    _cache_size = 0
+
+def _buffer():
+
+    global _file_buf, _file_view
+
+    if _file_buf is None:
+        _file_buf = bytearray(_chunk_size)
+        _file_view = memoryview(_file_buf)
+    return _file_buf
+
+def _content_type(file):
+
+    i = file.rfind('.')
+    return mime_types.get(file[i + 1:]) if i >= 0 else None
+
+def _file_exists(file):
+
+    try:
+        os.stat(file)
+        return True
+    except OSError:
+        return False
+
+def _file_crc(file):
+
+    crc = 0
+    buf = _buffer()
+    with open(file, 'rb') as f:
+        while True:
+            n = f.readinto(buf)
+            if not n:
+                break
+            crc = binascii.crc32(_file_view[:n], crc)
+    return crc & 0xffffffff
+
+def _file_variant(file, content_type, status, encoding = None):
+    # Pre-renders the full and the 304 Not Modified header of a file, validators
+    # are computed once here and compared byte-wise with request headers later
+
+    stat = os.stat(file)
+    size = stat[6]
+    # strong validator from the file size and a CRC32 of its content
+    etag = '"{:x}-{:08x}"'.format(size, _file_crc(file))
+    last_modified = http_date(stat[8])
+
+    headers = {
+        'Cache-Control': 'max-age=86400',
+        'Vary': 'Accept-Encoding',
+        'ETag': etag,
+        'Last-Modified': last_modified
+    }
+    not_modified_header = create_header(headers, 304) if status == 200 else None
+
+    headers['Content-Type'] = content_type
+    headers['Content-Length'] = str(size)
+    if encoding:
+        headers['Content-Encoding'] = encoding
+    header = create_header(headers, status)
+
+    return (file, header, not_modified_header, etag.encode(), last_modified.encode(), size)
+
+def _file_variants(static_file):
+    # static_file is [file, content type, status, variants], the variants of
+    # the file and its gzip version (if uploaded) are made on the first
+    # request, reading every file for its ETag at boot would delay it
+
+    variants = static_file[3]
+    if variants is not None:
+        return variants
+
+    (file, content_type, status) = static_file[:3]
+    gz_file = file + '.gz'
+    variants = (_file_variant(file, content_type, status),
+                _file_variant(gz_file, content_type, status, 'gzip') if _file_exists(gz_file) else None)
+
+    static_file[3] = variants
+    return variants
+
+def _is_not_modified(request, etag, last_modified):
+
+    if request.has_header(b'if-none-match'):
+        return request.header_equals(b'if-none-match', b'*') or request.header_contains(b'if-none-match', etag)
+
+    return request.header_equals(b'if-modified-since', last_modified)
+
+def _cache_get(file):
+
+    data = _cache.get(file)
+    if data is not None and _cache_order[-1] != file:
+        _cache_order.remove(file)
+        _cache_order.append(file)
+    return data
+
+def _cache_put(file, data):
+
+    global _cache_size
+
+    while _cache_order and _cache_size + len(data) > _cache_budget:
+        _cache_size -= len(_cache.pop(_cache_order.pop(0)))
+
+    _cache[file] = data
+    _cache_order.append(file)
+    _cache_size += len(data)
+
+async def _send_file(conn, static_file):
+
+    (variant, gz_variant) = _file_variants(static_file)
+    request = conn.request
+
+    # serve precompressed variant if the client accepts it
+    if gz_variant and request.header_has(b'accept-encoding', b'gzip'):
+        variant = gz_variant
+
+    (file, header, not_modified_header, etag, last_modified, size) = variant
+
+    if not_modified_header and _is_not_modified(request, etag, last_modified):
+        send_header(conn, not_modified_header)
+        return
+
+    send_header(conn, header)
+
+    if size <= _cache_max_file and size <= _cache_budget:
+        data = _cache_get(file)
+        if data is None:
+            _counters[_FILE_CACHE_MISSES] += 1
+            with open(file, 'rb') as f:
+                data = f.read()
+            _cache_put(file, data)
+        else:
+            _counters[_FILE_CACHE_HITS] += 1
+        conn.write(data)
+        return
+
+    buf = _buffer()
+    with open(file, 'rb') as f:
+        while True:
+            n = f.readinto(buf)
+            if not n:
+                break
+            conn.write(_file_view if n == len(buf) else _file_view[:n])
+            await conn.drain()
+
+def _file_handler(file, status = 200):
+    # Returns a handler sending file, None for a type not in mime_types
+
+    content_type = _content_type(file)
+    if content_type is None:
+        return None
+
+    static_file = [file, content_type, status, None]
+    async def _handler(conn, body):
+        await _send_file(conn, static_file)
+    return _handler
+
+def serve_file(url, file):
+    # Returns False if the file type is not in mime_types
+
+    handler = _file_handler(file)
+    if handler is None:
+        return False
+
+    _add_handler('GET', url, handler)
+    return True
+
+def serve_dir(directory = '', url = '/', index = None, not_found_page = None):
+    # Serves every file in directory of a type in mime_types under url, index
+    # at url itself and not_found_page (with 404) for requests without a route.
+    # Files added later are not served.
+
+    global _not_found_handler
+
+    prefix = directory + '/' if directory else ''
+    base = url if url[-1:] == '/' else url + '/'
+
+    for name in (os.listdir(directory) if directory else os.listdir()):
+        serve_file(base + name, prefix + name)
+
+    if index:
+        serve_file(url, prefix + index)
+
+    if not_found_page:
+        handler = _file_handler(prefix + not_found_page, 404)
+        if handler is not None:
+            _not_found_handler = handler
+
+# -----------------------------------------------------------------------------
+# metrics
+
+# indexes into _counters
+_BYTES_SENT = 0
+_AUTH_FAILURES = 1
+_AUTH_BLOCKED = 2
+_FILE_CACHE_HITS = 3
+_FILE_CACHE_MISSES = 4
+_counters = array.array('L', [0, 0, 0, 0, 0])
+
+# request count and total milliseconds per route, index 0 is for requests
+# without a route
+_route_paths = ['unmatched']
+_route_requests = array.array('L', [0])
+_route_ms = array.array('L', [0])
+
+_latency = metrics.Histogram('http_request_duration_seconds', (5, 10, 25, 50, 100, 250, 500, 1000, 2500), 1000,
+                             'time from the parsed request to the drained response')
+
+def _add_route_metrics(path):
+    # Returns the metrics index of a new route
+
+    _route_paths.append(path)
+    _route_requests.append(0)
+    _route_ms.append(0)
+    return len(_route_paths) - 1
+
+def _record_request(index, ms):
+
+    _route_requests[index] += 1
+    _route_ms[index] += ms
+    _latency.observe(ms)
+    metrics.sample_heap()
+
+def _collect_metrics(out):
+
+    out.append('# TYPE http_requests_total counter')
+    for i in range(len(_route_paths)):
+        out.append('http_requests_total{{route="{}"}} {}'.format(_route_paths[i], _route_requests[i]))
+    out.append('# TYPE http_route_duration_seconds_total counter')
+    for i in range(len(_route_paths)):
+        out.append('http_route_duration_seconds_total{{route="{}"}} {:.3f}'.format(_route_paths[i], _route_ms[i] / 1000))
+
+    metrics.counter(out, 'http_response_bytes_total', _counters[_BYTES_SENT])
+    metrics.counter(out, 'http_auth_failures_total', _counters[_AUTH_FAILURES], 'requests with wrong credentials')
+    metrics.counter(out, 'http_auth_blocked_total', _counters[_AUTH_BLOCKED], 'requests refused after too many failures')
+    metrics.counter(out, 'http_file_cache_hits_total', _counters[_FILE_CACHE_HITS])
+    metrics.counter(out, 'http_file_cache_misses_total', _counters[_FILE_CACHE_MISSES])
+    metrics.gauge(out, 'http_file_cache_bytes', _cache_size)
+    metrics.gauge(out, 'http_connections_active', connections_active)
+    metrics.counter(out, 'http_connections_rejected_total', connections_rejected)
+    metrics.counter(out, 'http_connections_timed_out_total', connections_timed_out)
+    metrics.counter(out, 'http_connections_evicted_total', connections_evicted, 'idle keep-alive connections closed for new ones')
+    metrics.gauge(out, 'http_streams_active', streams_active)
+
+metrics.add_collector(_collect_metrics)
+
+_metrics_header = create_header({ 'Content-Type': 'text/plain; version=0.0.4' }, 200)
+
+async def _handle_metrics(conn, body):
+
+    # lines are written one by one, joining them would need the text twice
+    lines = metrics.collect()
+    length = len(lines)
+    for line in lines:
+        length += len(line)
+
+    send_header(conn, _metrics_header, length)
+    for line in lines:
+        conn.write(line)
+        conn.write(b'\n')
+
+def enable_metrics(url = '/metrics'):
+    # Serves all metrics (including those of other modules) at url
+
+    _add_handler('GET', url, _handle_metrics)
 
-    return header
-    
 # -----------------------------------------------------------------------------
 # listening
 
 async def _conn_close(writer):
 
     _log('closing connection')
-    await writer.drain()
-    writer.close()
-    await writer.wait_closed()
+    try:
+        await writer.drain()
+        writer.close()
+        await writer.wait_closed()
+    except OSError:
+        # the client is already gone
+        pass
 
-async def _conn_handler(reader, writer):
- 
+def _timed_out(conn):
+
+    global connections_timed_out
+
+    connections_timed_out += 1
+    conn.keep_alive = False
+
+async def _request_handler(conn):
+
+    req = conn.request
+
+    # get start line, connections wait between requests as long as idle
+    # connections do, but a new one has to send its first request quickly
+    conn.idle_since = utime.ticks_ms() if conn.requests else None
     try:
-        addr = writer.get_extra_info('peername')
-        _log('client connected, address:', addr)
+        result = await asyncio.wait_for(req.start_line(), _keep_alive_timeout_s if conn.requests else _header_timeout_s)
+    except asyncio.TimeoutError:
+        _log('keep-alive timeout')
+        conn.idle_since = None
+        if not conn.requests:
+            _timed_out(conn)
+        return False
+    conn.idle_since = None
 
-        # if basic authentication is enabled dont accept clients without credentials 
-        authorized = not _basic_auth_enabled
+    # get headers and body (if available), wait_for creates a task so it is
+    # skipped when they arrived with the start line
+    try:
+        if result == _PARSE_OK:
+            if req.headers_buffered():
+                result = await req.read_headers()
+            else:
+                result = await asyncio.wait_for(req.read_headers(), _header_timeout_s)
+        if result == _PARSE_OK:
+            if req.body_buffered():
+                result = await req.read_body()
+            else:
+                result = await asyncio.wait_for(req.read_body(), _body_timeout_s)
+    except asyncio.TimeoutError:
+        _log('request timeout')
+        _timed_out(conn)
+        send_header(conn, _error_headers[408])
+        return False
 
-        # get start line
-        start = await reader.readline()
+    if result == _PARSE_EOF:
+        return False
 
-        # get headers
-        body_length = 0
-        while True:
-            header = await reader.readline()
-            if header == b'\r\n' or header == b'' or header == None:
-                break
-            if b'Content-Length' in header:
-                body_length = int(''.join(list(filter(str.isdigit, header.decode()))))
-            if b'Authorization' in header:
-                authorized = _authenticate(header.decode())
-
-        # get body (if available)
-        body = await reader.readexactly(body_length)
-
-        start = start.decode().split(' ')
-        if len(start) != 3:
-            await _conn_close(writer)
-            return
-
-        (method, url, version) = start
-
-        _log('method: ', method)
-        _log('url: ', url)
-        _log('version: ', version)
-        _log('body: ', body, body_length)
-
-        if not authorized:
-            headers = { 'WWW-Authenticate': 'Basic realm="general", charset="UTF-8"' }
-            writer.write(create_header(headers, 401))
-            _log('unauthorized')
-            await _conn_close(writer)
-            return
-
-        if method in _handlers and url in _handlers[method]:
-            await _handlers[method][url](writer, body.decode('utf-8'))
+    if result != _PARSE_OK:
+        # the rest of the stream can't be trusted anymore, reply and close
+        _log('malformed request:', result)
+        conn.keep_alive = False
+        send_header(conn, _error_headers[result])
+        await conn.drain()
+        return False
+
+    # HTTP/1.1 connections are persistent unless the client opts out,
+    # HTTP/1.0 connections are closed unless the client opts in
+    if req.http11:
+        keep_alive = not req.header_has(b'connection', b'close', b'Close')
+    else:
+        keep_alive = req.header_has(b'connection', b'keep-alive', b'Keep-Alive')
+
+    conn.requests += 1
+    conn.keep_alive = keep_alive and conn.requests < _keep_alive_max_requests
+
+    # if basic authentication is enabled dont accept clients without credentials
+    auth = _check_auth(conn) if _basic_auth_enabled else 200
+
+    method = req.method
+    url = req.url
+    i = url.find('?')
+    path = _normalize(url if i < 0 else url[:i])
+
+    _log('method: ', method)
+    _log('url: ', url)
+    _log('body: ', req.body)
+
+    try:
+        (route, conn.params) = _find_route(path)
+        conn.query = parse_query(url[i + 1:]) if i >= 0 else _no_query
+        bad_url = False
+    except ValueError:
+        # a percent escape that does not decode as UTF-8
+        (route, conn.params, conn.query) = (None, None, _no_query)
+        bad_url = True
+    start = utime.ticks_ms()
+
+    if auth == 429:
+        send_header(conn, _too_many_attempts_header)
+        _log('too many failed logins')
+    elif auth != 200:
+        send_header(conn, _unauthorized_header)
+        _log('unauthorized')
+    elif bad_url:
+        send_header(conn, _error_headers[400])
+        _log('malformed url')
+    elif route is not None and method in route[0]:
+        await route[0][method](conn, req.body)
+    elif route is not None:
+        _log('method not allowed')
+        send_header(conn, _method_not_allowed_header(route))
+    else:
+        _log('no handler for request')
+        if _not_found_handler:
+            await _not_found_handler(conn, '')
         else:
-            _log('no handler for request')
-            await _not_found_handler(writer, '') if _not_found_handler else None
+            send_header(conn, _not_found_header)
+
+    await conn.drain()
+    _record_request(route[2] if route is not None else 0, utime.ticks_diff(utime.ticks_ms(), start))
+    return conn.keep_alive
+
+_unauthorized_header = create_header({
+    'WWW-Authenticate': 'Basic realm="general", charset="UTF-8"',
+    'Content-Length': '0'
+}, 401)
+
+_too_many_attempts_header = create_header({
+    'Retry-After': str(auth_block_s),
+    'Content-Length': '0'
+}, 429)
+
+_not_found_header = create_header({ 'Content-Length': '0' }, 404)
+
+_ws_upgrade_header = create_header({
+    'Upgrade': 'websocket',
+    'Connection': 'Upgrade'
+}, 101)
+
+_error_headers = {
+    400: create_header({ 'Content-Length': '0' }, 400),
+    408: create_header({ 'Content-Length': '0' }, 408),
+    413: create_header({ 'Content-Length': '0' }, 413),
+    431: create_header({ 'Content-Length': '0' }, 431),
+    501: create_header({ 'Content-Length': '0' }, 501)
+}
+
+_busy_header = create_header({
+    'Retry-After': '5',
+    'Content-Length': '0'
+}, 503)
+
+async def _conn_handler(reader, writer):
+
+    addr = writer.get_extra_info('peername')
+    addr = addr[0] if addr else None
+    _log('client connected, address:', addr)
+
+    if not _admit(addr):
+        _log('connection rejected')
+        writer.write(_busy_header)
+        writer.write(_server_header)
+        writer.write(_close_header)
+        await _conn_close(writer)
+        return
+
+    global streams_active
+
+    conn = None
+    try:
+        # serve requests back to back until the client or the limits close the connection
+        conn = _Connection(reader, writer, addr)
+        conn.task = asyncio.current_task()
+        _connections.append(conn)
+        while await _request_handler(conn):
+            pass
 
     except OSError as e:
         _log('OSError:', e)
+    except asyncio.CancelledError:
+        # evicted while idle
+        pass
     finally:
+        if conn is not None and conn.stream:
+            streams_active -= 1
+        else:
+            if conn is not None:
+                _connections.remove(conn)
+            _release(addr)
         await _conn_close(writer)
 
 async def start():
@@ -1,12 +1,15 @@
 # -----------------------------------------------------------------------------
 # imports
 
-import os
 import json
-import random
 import httpserver
 import credentials
 import rgbled
+import effects
+import segments
+import presets
+import scheduler
+import metrics
 import uasyncio as asyncio
 
 from machine import Pin
@@ -23,29 +26,49 @@ def set_global_exception():
     loop = asyncio.get_event_loop()
     loop.set_exception_handler(handle_exception)
 
-def get_file_size(file):
-    return os.stat(file)[6]
+def get_effect_name():
+    # The effect and color of the first segment stand for the whole strip
 
-def read_file_in_chunks(file, chunk_size = 1024):
-    while True:
-        chunk = file.read(chunk_size)
-        if not chunk:
-            break
-        else:
-            yield chunk
+    all_segments = segments.get_all()
+    return all_segments[0].effect_name if all_segments else ''
 
-def run_animation_task(name):
+def get_color():
 
-    global animation_name, animation_task, animation_map
+    all_segments = segments.get_all()
+    return all_segments[0].color if all_segments else rgbled.get_next_color()
 
-    if name == animation_name or name not in animation_map:
-        return
+def set_effect(name, params = None):
+    # Switches all segments to the named effect and/or applies its params,
+    # raises KeyError for an unknown effect and ValueError for invalid params
+
+    for segment in segments.get_all():
+        segment.set_effect(name, params)
+    notify_state_change(STATE_EFFECT | STATE_SEGMENTS)
+
+def set_timer(seconds):
+    # Turns the light off after seconds, 0 cancels the timer. Raises
+    # ValueError for anything but a non-negative int.
+
+    global shutdown_timer
+    global shutdown_timer_remaining_seconds
+
+    if not isinstance(seconds, int) or seconds < 0:
+        raise ValueError('invalid timer')
+
+    shutdown_timer_remaining_seconds = seconds
+
+    if shutdown_timer_remaining_seconds > 0:
+        shutdown_timer.init(period = 1000, mode=Timer.PERIODIC, callback = shutdown_timer_callback)
+    else:
+        shutdown_timer.deinit()
+    notify_state_change(STATE_TIMER)
 
-    if animation_task:
-        animation_task.cancel()
+def set_color(r, g, b):
 
-    animation_name = name
-    animation_task = asyncio.create_task(animation_map[name]())
+    rgbled.set_next_color(r, g, b)
+    for segment in segments.get_all():
+        segment.set_color(r, g, b)
+    notify_state_change(STATE_COLOR | STATE_SEGMENTS)
 
 shutdown_timer = Timer(-1)
 shutdown_timer_remaining_seconds = 0
@@ -59,17 +82,76 @@ def shutdown_timer_callback(timer):
         timer.deinit()
 
 # -----------------------------------------------------------------------------
-# tasks
+# state events
 
-color_change_evt = asyncio.Event()
+STATE_COLOR = 1
+STATE_EFFECT = 2
+STATE_TIMER = 4
+STATE_SEGMENTS = 8
+STATE_ALL = STATE_COLOR | STATE_EFFECT | STATE_TIMER | STATE_SEGMENTS
 
-async def shutdown():
+events_max_subscribers = 2
+events_coalesce_ms = 100
+events_heartbeat_s = 15
+
+# each subscriber is a [event, mask of changed state] pair
+_events_subscribers = []
+
+def get_state(mask = STATE_ALL):
+
+    state = {}
+    if mask & STATE_COLOR:
+        color = get_color()
+        state['color'] = {'r':color[0],'g':color[1],'b':color[2]}
+    if mask & STATE_EFFECT:
+        state['effect'] = get_effect_name()
+    if mask & STATE_TIMER:
+        state['timer'] = shutdown_timer_remaining_seconds
+    if mask & STATE_SEGMENTS:
+        state['segments'] = [segment.state() for segment in segments.get_all()]
+    return state
+
+def notify_state_change(mask):
+
+    if mask & (STATE_COLOR | STATE_EFFECT | STATE_SEGMENTS):
+        presets.scene_changed()
 
-    global color_change_evt
+    for subscriber in _events_subscribers:
+        subscriber[1] |= mask
+        subscriber[0].set()
 
-    rgbled.set_next_color(0, 0, 0)
-    color_change_evt.set()
-    run_animation_task('color')
+async def stream_state_events(conn, subscriber):
+
+    (event, _) = subscriber
+
+    while True:
+        try:
+            await asyncio.wait_for(event.wait(), events_heartbeat_s)
+        except asyncio.TimeoutError:
+            # comment line keeps proxies happy and detects dead clients
+            conn.write(b':\n\n')
+            await conn.drain()
+            continue
+
+        # let rapid updates (e.g. a color wheel drag) pile up into one delta
+        await asyncio.sleep_ms(events_coalesce_ms)
+        event.clear()
+        mask = subscriber[1]
+        subscriber[1] = 0
+
+        conn.write(b'data: ')
+        conn.write(json.dumps(get_state(mask)))
+        conn.write(b'\n\n')
+        await conn.drain()
+
+# -----------------------------------------------------------------------------
+# tasks
+
+async def shutdown():
+
+    set_color(0, 0, 0)
+    set_effect('color')
+    notify_state_change(STATE_TIMER)
 
 async def blink(led, period_s):
 
@@ -79,161 +161,348 @@ async def blink(led, period_s):
         led.off()
         await asyncio.sleep(period_s)
 
-async def color_animation():
+# -----------------------------------------------------------------------------
+# http handlers
 
-    global color_change_evt
+_state_header = httpserver.create_header({ 'Content-Type': 'application/json' }, 200)
 
-    # trigger the task
-    color_change_evt.set()
+def send_json(conn, content):
+    # Content-Length counts bytes, preset and segment names may be non-ASCII
 
-    while True:
-        await color_change_evt.wait()
-        color_change_evt.clear()
-        color = rgbled.get_next_color()
-        rgbled.strip_set_smooth(color[0], color[1], color[2])
+    data = json.dumps(content).encode()
+    httpserver.send_header(conn, _state_header, len(data))
+    conn.write(data)
 
-async def rainbow_animation():
+@httpserver.handle('GET', '/state')
+async def handle_get_state(conn, body):
 
-    while True:
-        rgbled.strip_rainbow()
-        await asyncio.sleep(0.01)
+    # the same color and effect as the events report
+    send_json(conn, get_state(STATE_COLOR | STATE_EFFECT | STATE_TIMER))
 
-async def fire_animation():
+_no_content_header = httpserver.create_header({}, 204)
+_bad_request_header = httpserver.create_header({ 'Content-Length': '0' }, 400)
 
-    while True:
-        rgbled.strip_fire()
-        await asyncio.sleep(random.randint(10, 50) / 1000)
+@httpserver.handle('POST', '/color')
+async def handle_post_color(conn, body):
 
-async def breathe_animation():
+    json_rgb = json.loads(body)
+    set_color(json_rgb['r'], json_rgb['g'], json_rgb['b'])
 
-    global color_change_evt
+    httpserver.send_header(conn, _no_content_header)
 
-    # trigger the task
-    color_change_evt.set()
+@httpserver.handle('GET', '/effects')
+async def handle_get_effects(conn, body):
 
-    while True:
-        if color_change_evt.is_set():
-            color_change_evt.clear()
-            color = rgbled.get_next_color()
-            rgbled.strip_breathe_setup(color[0], color[1], color[2])
-
-        rgbled.strip_breathe()
-        await asyncio.sleep(0.001)
-
-animation_name = ''
-animation_task = None
-animation_map = {
-    'color': color_animation,
-    'breathe': breathe_animation,
-    'fire': fire_animation,
-    'rainbow': rainbow_animation
-}
+    # params as the first segment has them, like the effect in /state
+    all_segments = segments.get_all()
+    instances = all_segments[0].effect_instances() if all_segments else {}
+    send_json(conn, {'effects': effects.describe(instances), 'palettes': list(effects.palettes)})
 
-# -----------------------------------------------------------------------------
-# http handlers
+# {"effect": "fire", "params": {"speed": 150, "palette": "ice"}}, both keys are
+# optional, params alone tune the running effect
+@httpserver.handle('POST', '/effect')
+async def handle_post_effect(conn, body):
 
-async def handle_http_file(conn, file, content_type, code = 200):
+    try:
+        request = json.loads(body)
+    except ValueError:
+        request = None
+    if not isinstance(request, dict):
+        httpserver.send_header(conn, _bad_request_header)
+        return
 
-    headers = {
-        'Content-Type': content_type,
-        'Content-Length': str(get_file_size(file)),
-        'Cache-Control': 'max-age=86400'
-    }
-    conn.write(httpserver.create_header(headers, code))
+    try:
+        set_effect(request.get('effect', get_effect_name()), request.get('params'))
+    except (KeyError, ValueError, TypeError):
+        httpserver.send_header(conn, _bad_request_header)
+        return
 
-    with open(file, 'rb') as f:
-        for chunk in read_file_in_chunks(f):
-            conn.write(chunk)
-            await conn.drain()
+    httpserver.send_header(conn, _no_content_header)
 
-@httpserver.handle('GET', '/')
-async def handle_main_page(conn, body):
+@httpserver.handle('POST', '/timer')
+async def handle_post_timer(conn, body):
 
-    await handle_http_file(conn, 'page.html', 'text/html')
+    try:
+        set_timer(json.loads(body)['seconds'])
+    except (KeyError, TypeError, ValueError):
+        httpserver.send_header(conn, _bad_request_header)
+        return
 
-@httpserver.handle('GET', '/favicon.ico')
-async def handle_favicon(conn, body):
+    httpserver.send_header(conn, _no_content_header)
 
-    await handle_http_file(conn, 'favicon.ico', 'image/x-icon')
+_events_header = httpserver.create_header({
+    'Content-Type': 'text/event-stream',
+    'Cache-Control': 'no-cache'
+}, 200)
 
-@httpserver.handle('GET', '/script.js')
-async def handle_javascript(conn, body):
+_events_busy_header = httpserver.create_header({
+    'Retry-After': '5',
+    'Content-Length': '0'
+}, 503)
 
-    await handle_http_file(conn, 'script.js', 'text/javascript')
+@httpserver.handle('GET', '/events')
+async def handle_get_events(conn, body):
 
-@httpserver.handle('GET', '/styles.css')
-async def handle_css_styles(conn, body):
+    if len(_events_subscribers) >= events_max_subscribers or not httpserver.begin_stream(conn):
+        httpserver.send_header(conn, _events_busy_header)
+        return
 
-    await handle_http_file(conn, 'styles.css', 'text/css')
+    # the stream has no length, it ends when the connection does
+    conn.keep_alive = False
+    httpserver.send_header(conn, _events_header)
+
+    # first message carries the full state
+    subscriber = [asyncio.Event(), STATE_ALL]
+    subscriber[0].set()
+    _events_subscribers.append(subscriber)
+    try:
+        await stream_state_events(conn, subscriber)
+    except OSError:
+        pass
+    finally:
+        _events_subscribers.remove(subscriber)
+
+_not_found_header = httpserver.create_header({ 'Content-Length': '0' }, 404)
+
+@httpserver.handle('GET', '/segments')
+async def handle_get_segments(conn, body):
+
+    send_json(conn, [segment.state() for segment in segments.get_all()])
+
+# {"start": 0, "length": 30, "reverse": false} creates or moves a segment
+@httpserver.handle('POST', '/segments/<name>')
+async def handle_post_segment(conn, body):
+
+    request = json.loads(body)
+    try:
+        segments.set_segment(conn.params['name'], request['start'], request['length'], request.get('reverse', False))
+    except (KeyError, ValueError):
+        httpserver.send_header(conn, _bad_request_header)
+        return
 
-@httpserver.handle('GET', '/state')
-async def handle_get_state(conn, body):
+    notify_state_change(STATE_SEGMENTS)
+    httpserver.send_header(conn, _no_content_header)
 
-    global shutdown_timer_remaining_seconds, animation
+@httpserver.handle('DELETE', '/segments/<name>')
+async def handle_delete_segment(conn, body):
 
-    color = rgbled.get_color()
-    timer = shutdown_timer_remaining_seconds
-    effect = animation_name
-    json_str = json.dumps({'color':{'r':color[0],'g':color[1],'b':color[2]}, 'timer':timer, 'effect':effect})
+    if not segments.remove(conn.params['name']):
+        httpserver.send_header(conn, _not_found_header)
+        return
 
-    headers = {
-        'Content-Type': 'application/json',
-        'Content-Length': str(len(json_str))
-    }
-    conn.write(httpserver.create_header(headers, 200))
-    conn.write(json_str)
+    notify_state_change(STATE_EFFECT | STATE_SEGMENTS)
+    httpserver.send_header(conn, _no_content_header)
 
-@httpserver.handle('POST', '/color')
-async def handle_post_color(conn, body):
+@httpserver.handle('POST', '/segments/<name>/color')
+async def handle_post_segment_color(conn, body):
 
-    global color_change_evt
+    segment = segments.get(conn.params['name'])
+    if segment is None:
+        httpserver.send_header(conn, _not_found_header)
+        return
 
     json_rgb = json.loads(body)
-    rgbled.set_next_color(json_rgb['r'], json_rgb['g'], json_rgb['b'])
-    color_change_evt.set()
+    segment.set_color(json_rgb['r'], json_rgb['g'], json_rgb['b'])
 
-    headers = {
-        'ETag': '\"' + str(body) + '\"'
-    }
-    conn.write(httpserver.create_header(headers, 204))
+    notify_state_change(STATE_SEGMENTS)
+    httpserver.send_header(conn, _no_content_header)
 
-@httpserver.handle('POST', '/effect')
-async def handle_post_effect(conn, body):
+@httpserver.handle('POST', '/segments/<name>/effect')
+async def handle_post_segment_effect(conn, body):
 
-    effect = json.loads(body)['effect']
-    run_animation_task(effect)
+    segment = segments.get(conn.params['name'])
+    if segment is None:
+        httpserver.send_header(conn, _not_found_header)
+        return
 
-    headers = {
-        'ETag': '\"' + str(body) + '\"'
-    }
-    conn.write(httpserver.create_header(headers, 204))
+    request = json.loads(body)
+    try:
+        segment.set_effect(request.get('effect', segment.effect_name), request.get('params'))
+    except (KeyError, ValueError):
+        httpserver.send_header(conn, _bad_request_header)
+        return
 
-@httpserver.handle('POST', '/timer')
-async def handle_post_timer(conn, body):
+    notify_state_change(STATE_EFFECT | STATE_SEGMENTS)
+    httpserver.send_header(conn, _no_content_header)
 
-    global shutdown_timer
-    global shutdown_timer_remaining_seconds
+# Batch of commands applied in order without yielding to other tasks, so all
+# of them show up in the same animation frame. Commands are
+#   {"cmd": "color", "r": 255, "g": 0, "b": 0 [, "segment": "left"]}
+#   {"cmd": "effect", "effect": "fire" [, "params": {...}] [, "segment": "left"]}
+#   {"cmd": "timer", "seconds": 600}
+#   {"cmd": "segment", "name": "left", "start": 0, "length": 30 [, "reverse": true]}
+#   {"cmd": "remove_segment", "name": "left"}
+#   {"cmd": "preset", "name": "evening"}
+# The response holds one HTTP like status per command, e.g. {"status": [204, 404]}
 
-    shutdown_timer_remaining_seconds = json.loads(body)['seconds']
+def _batch_segment(cmd):
 
-    if shutdown_timer_remaining_seconds > 0:
-        shutdown_timer.init(period = 1000, mode=Timer.PERIODIC, callback = shutdown_timer_callback)
-    else:
-        shutdown_timer.deinit()
+    return segments.get(cmd['segment'])
+
+def _batch_color(cmd):
+
+    rgb = (cmd['r'], cmd['g'], cmd['b'])
+    for c in rgb:
+        if not isinstance(c, int) or c < 0 or c > 255:
+            return 400
+
+    if 'segment' not in cmd:
+        set_color(rgb[0], rgb[1], rgb[2])
+        return 204
+
+    segment = _batch_segment(cmd)
+    if segment is None:
+        return 404
+    segment.set_color(rgb[0], rgb[1], rgb[2])
+    notify_state_change(STATE_SEGMENTS)
+    return 204
+
+def _batch_effect(cmd):
+
+    if 'segment' not in cmd:
+        set_effect(cmd['effect'], cmd.get('params'))
+        return 204
+
+    segment = _batch_segment(cmd)
+    if segment is None:
+        return 404
+    segment.set_effect(cmd['effect'], cmd.get('params'))
+    notify_state_change(STATE_EFFECT | STATE_SEGMENTS)
+    return 204
+
+def _batch_timer(cmd):
+
+    set_timer(cmd['seconds'])
+    return 204
+
+def _batch_set_segment(cmd):
+
+    segments.set_segment(cmd['name'], cmd['start'], cmd['length'], cmd.get('reverse', False))
+    notify_state_change(STATE_SEGMENTS)
+    return 204
 
-    headers = {
-        'ETag': '\"' + str(body) + '\"'
-    }
-    conn.write(httpserver.create_header(headers, 204))
+def _batch_remove_segment(cmd):
 
-@httpserver.not_found()
-async def handle_not_found(conn, body):
+    if not segments.remove(cmd['name']):
+        return 404
+    notify_state_change(STATE_EFFECT | STATE_SEGMENTS)
+    return 204
 
-    await handle_http_file(conn, '404.html', 'text/html', 404)
+def _batch_preset(cmd):
+
+    if not presets.load(cmd['name']):
+        return 404
+    notify_state_change(STATE_ALL & ~STATE_TIMER)
+    return 204
+
+_batch_commands = {
+    'color': _batch_color,
+    'effect': _batch_effect,
+    'timer': _batch_timer,
+    'segment': _batch_set_segment,
+    'remove_segment': _batch_remove_segment,
+    'preset': _batch_preset
+}
+
+def run_batch(commands):
+
+    status = []
+    for cmd in commands:
+        try:
+            status.append(_batch_commands[cmd['cmd']](cmd))
+        except (KeyError, ValueError, TypeError):
+            status.append(400)
+    return status
+
+@httpserver.handle('POST', '/batch')
+async def handle_post_batch(conn, body):
+
+    try:
+        commands = json.loads(body)
+    except ValueError:
+        commands = None
+    if not isinstance(commands, list):
+        httpserver.send_header(conn, _bad_request_header)
+        return
+
+    send_json(conn, {'status': run_batch(commands)})
+
+@httpserver.handle('GET', '/presets')
+async def handle_get_presets(conn, body):
+
+    send_json(conn, {'presets': presets.get_names()})
+
+# {"save": "evening"} stores the scene shown, {"apply": "evening"} shows a
+# stored one and {"delete": "evening"} removes it
+@httpserver.handle('POST', '/presets')
+async def handle_post_presets(conn, body):
+
+    try:
+        request = json.loads(body)
+    except ValueError:
+        request = None
+    if not isinstance(request, dict):
+        httpserver.send_header(conn, _bad_request_header)
+        return
+
+    try:
+        if 'save' in request:
+            presets.save(request['save'])
+            found = True
+        elif 'apply' in request:
+            found = presets.load(request['apply'])
+            if found:
+                notify_state_change(STATE_ALL & ~STATE_TIMER)
+        else:
+            found = presets.remove(request['delete'])
+    except (KeyError, ValueError, TypeError):
+        httpserver.send_header(conn, _bad_request_header)
+        return
+
+    httpserver.send_header(conn, _no_content_header if found else _not_found_header)
+
+# Binary control frame: r, g, b [, effect id [, timer seconds (16-bit big endian)]]
+# Effect ids are positions in the effect registry, id 0xff and timer 0xffff
+# leave the current value unchanged.
+ws_effect_ids = effects.names()
+
+def apply_control_frame(frame):
+
+    if len(frame) < 3:
+        return False
+
+    set_color(frame[0], frame[1], frame[2])
+
+    if len(frame) >= 4 and frame[3] < len(ws_effect_ids):
+        set_effect(ws_effect_ids[frame[3]])
+
+    if len(frame) >= 6:
+        seconds = (frame[4] << 8) | frame[5]
+        if seconds != 0xffff:
+            set_timer(seconds)
+
+    return True
+
+@httpserver.websocket('/ws')
+async def handle_ws_control(ws):
+
+    while True:
+        msg = await ws.recv()
+        if msg is None:
+            break
+
+        (opcode, payload) = msg
+        if opcode != httpserver.WS_BINARY or not apply_control_frame(payload):
+            await ws.close(1003)
+            break
 
 # -----------------------------------------------------------------------------
 # 'main'
 
+# bits per channel the effects render at, over 8 the strip is dithered down
+# to 8 bits every frame
+STRIP_DEPTH = 12
+
 async def main():
     print('--- main.py ---')
 
@@ -247,20 +516,32 @@ async def main():
     io12.on()
     io13.on()
 
-    # LED strip with 60 LEDs on pin 14
-    rgbled.strip_init(14, 60)
+    # LED strip with 60 LEDs on pin 14, all segments are composited into its
+    # frame and written by the scheduler only
+    rgbled.strip_init(14, 60, STRIP_DEPTH)
+    segments.init(rgbled.strip_frame(), rgbled.strip_bpp())
+    scheduler.init(rgbled.strip_write, dither = rgbled.strip_dither if STRIP_DEPTH > 8 else None)
 
     httpserver.init(credentials.wifi_ssid, credentials.wifi_pwd)
-    httpserver.enable_basic_auth(credentials.usr_name, credentials.usr_pwd)
+    httpserver.enable_basic_auth(credentials.usr_name, credentials.usr_pwd, session_s = 24 * 3600)
+    httpserver.enable_metrics()
+    # web assets, gzip variants are picked up by the server
+    httpserver.serve_dir(index = 'page.html', not_found_page = '404.html')
 
     blink_task = asyncio.create_task(blink(status_led, 0.5))
 
     http_srv_task = await httpserver.start()
+    metrics.record_boot()
+    print('listening {} ms after reset, {} bytes free'.format(metrics.boot_ms, metrics.boot_heap_free))
 
     # server started
     blink_task.cancel()
     status_led.on()
-    run_animation_task('color')
+    # show the scene from before the reboot
+    if not presets.restore():
+        set_effect('color')
+    scheduler.set_render(segments.render)
+    animation_task = asyncio.create_task(scheduler.run())
 
     while True:
         await asyncio.sleep(1)
@@ -0,0 +1,153 @@
+# -----------------------------------------------------------------------------
+# imports
+
+import gc
+import utime
+from array import array
+
+# -----------------------------------------------------------------------------
+# metrics
+
+# Allocation free instrumentation exposed in the Prometheus text format.
+# Counters live in fixed size integer arrays that are sized when a metric is
+# created, so recording a value on the hot path only stores small ints. Text
+# is rendered when metrics are scraped, e.g.
+#
+#   latency = metrics.Histogram('http_request_duration_seconds', (5, 10, 50), 1000)
+#   latency.observe(7)
+#
+# records a 7 ms request in the le="0.01" bucket.
+
+_collectors = []
+
+def add_collector(collector):
+    # Adds a collector(out) that appends lines of text to the list out
+
+    _collectors.append(collector)
+
+def collect():
+    # Returns the lines of all metrics
+
+    out = []
+    for collector in _collectors:
+        collector(out)
+    return out
+
+def counter(out, name, value, help_text = None):
+
+    _header(out, name, 'counter', help_text)
+    out.append('{} {}'.format(name, value))
+
+def gauge(out, name, value, help_text = None):
+
+    _header(out, name, 'gauge', help_text)
+    out.append('{} {}'.format(name, value))
+
+def _header(out, name, type, help_text):
+
+    if help_text:
+        out.append('# HELP {} {}'.format(name, help_text))
+    out.append('# TYPE {} {}'.format(name, type))
+
+class Histogram:
+    # Counts observations in buckets of upper bounds (ascending integers).
+    # Observations are integers in 1/scale units of the reported value, e.g.
+    # milliseconds with scale 1000 for a histogram in seconds. The sum is kept
+    # in whole units of 1/1000 of the reported value, carrying the remainder,
+    # so it stays a small int for a long time even for microsecond
+    # observations.
+
+    def __init__(self, name, bounds, scale, help_text = None):
+
+        self.name = name
+        self.help_text = help_text
+        self.bounds = bounds
+        self.scale = scale
+        self.counts = array('L', [0] * (len(bounds) + 1))
+        self.count = 0
+        self.sum_milli = 0
+        self._remainder = 0
+        self._labels = ['{:g}'.format(b / scale) for b in bounds] + ['+Inf']
+        add_collector(self.collect)
+
+    def observe(self, value):
+
+        bounds = self.bounds
+        i = 0
+        n = len(bounds)
+        while i < n and value > bounds[i]:
+            i += 1
+        self.counts[i] += 1
+        self.count += 1
+
+        # sum in 1/1000 of the reported unit
+        r = self._remainder + value * 1000
+        self.sum_milli += r // self.scale
+        self._remainder = r % self.scale
+
+    def collect(self, out):
+
+        name = self.name
+        _header(out, name, 'histogram', self.help_text)
+        total = 0
+        for i in range(len(self.counts)):
+            total += self.counts[i]
+            out.append('{}_bucket{{le="{}"}} {}'.format(name, self._labels[i], total))
+        out.append('{}_sum {:.3f}'.format(name, self.sum_milli / 1000))
+        out.append('{}_count {}'.format(name, self.count))
+
+# -----------------------------------------------------------------------------
+# heap
+
+heap_free_low = -1
+heap_alloc_high = 0
+
+# CPython has no heap statistics
+_heap_stats = hasattr(gc, 'mem_free')
+
+def sample_heap():
+    # Updates the heap watermarks, cheap enough for every request
+
+    global heap_free_low, heap_alloc_high
+
+    if not _heap_stats:
+        return
+
+    free = gc.mem_free()
+    alloc = gc.mem_alloc()
+    if heap_free_low < 0 or free < heap_free_low:
+        heap_free_low = free
+    if alloc > heap_alloc_high:
+        heap_alloc_high = alloc
+
+# boot: time from reset until the server listens and the free heap then
+boot_ms = -1
+boot_heap_free = -1
+
+# ticks at reset, they start at 0 on the device
+reset_ticks = 0
+
+def record_boot():
+
+    global boot_ms, boot_heap_free
+
+    boot_ms = utime.ticks_diff(utime.ticks_ms(), reset_ticks)
+    if _heap_stats:
+        gc.collect()
+        boot_heap_free = gc.mem_free()
+
+def _collect_heap(out):
+
+    if boot_ms >= 0:
+        gauge(out, 'boot_listen_ms', boot_ms, 'milliseconds from reset until the server listened')
+    if not _heap_stats:
+        return
+
+    sample_heap()
+    gauge(out, 'heap_free_bytes', gc.mem_free())
+    gauge(out, 'heap_alloc_bytes', gc.mem_alloc())
+    gauge(out, 'heap_free_low_bytes', heap_free_low, 'lowest free heap seen')
+    gauge(out, 'heap_alloc_high_bytes', heap_alloc_high, 'highest allocated heap seen')
+    gauge(out, 'boot_heap_free_bytes', boot_heap_free, 'free heap once the server listened')
+
+add_collector(_collect_heap)
@@ -0,0 +1,212 @@
+# -----------------------------------------------------------------------------
+# imports
+
+import os
+import json
+import utime
+import binascii
+import segments
+import uasyncio as asyncio
+
+# -----------------------------------------------------------------------------
+# configuration
+
+# A scene is the segment layout with each segment's color, effect and params.
+# The scene shown is kept in scene_file to restore it at boot, named scenes
+# (presets) in presets_file which is only read when presets are first used.
+# Flash wears with every write, so changes are written flush_delay_s after
+# they settle and only if the file content changes.
+scene_file = 'scene.json'
+presets_file = 'presets.json'
+max_presets = 16
+flush_delay_s = 10
+
+_presets = None
+_presets_dirty = False
+_presets_crc = None
+_scene_dirty = False
+_scene_crc = None
+
+_flush_task = None
+_flush_deadline = 0
+
+# -----------------------------------------------------------------------------
+# scenes
+
+def capture():
+
+    scene = []
+    for segment in segments.get_all():
+        scene.append({
+            'name': segment.name,
+            'start': segment.start,
+            'length': segment.length,
+            'reverse': segment.reverse,
+            'color': list(segment.color),
+            'effect': segment.effect_name,
+            'params': dict(segment.effect.params)
+        })
+    return scene
+
+def apply(scene):
+    # Raises KeyError or ValueError for a malformed scene
+
+    segments.set_layout([(s['name'], s['start'], s['length'], s.get('reverse', False)) for s in scene])
+
+    for s in scene:
+        segment = segments.get(s['name'])
+        c = s['color']
+        segment.set_color(c[0], c[1], c[2])
+        # the effect must not share the dict with the stored scene
+        params = s.get('params')
+        segment.set_effect(s['effect'], dict(params) if params else None)
+
+def scene_changed():
+    # Called on every change of the scene shown, it is saved once they settle
+
+    global _scene_dirty
+
+    _scene_dirty = True
+    _schedule_flush()
+
+def restore():
+    # Shows the scene saved before the last reboot, returns False if there is
+    # none or it could not be applied
+
+    global _scene_crc
+
+    (scene, _scene_crc) = _read_json(scene_file)
+    if not scene:
+        return False
+
+    try:
+        apply(scene)
+    except (KeyError, ValueError, TypeError):
+        return False
+    return True
+
+# -----------------------------------------------------------------------------
+# presets
+
+def _load():
+
+    global _presets, _presets_crc
+
+    if _presets is None:
+        (_presets, _presets_crc) = _read_json(presets_file)
+        if not isinstance(_presets, dict):
+            _presets = {}
+    return _presets
+
+def get_names():
+
+    return sorted(_load())
+
+def save(name):
+    # Saves the scene shown under name, raises ValueError if name is not a
+    # str or the store is full
+
+    global _presets_dirty
+
+    # names are JSON object keys in presets_file and are sorted together
+    if not isinstance(name, str):
+        raise ValueError('invalid name')
+
+    presets = _load()
+    if name not in presets and len(presets) >= max_presets:
+        raise ValueError('too many presets')
+
+    presets[name] = capture()
+    _presets_dirty = True
+    _schedule_flush()
+
+def load(name):
+    # Shows the preset, returns False if there is no such preset
+
+    scene = _load().get(name)
+    if scene is None:
+        return False
+
+    apply(scene)
+    return True
+
+def remove(name):
+    # Returns False if there is no such preset
+
+    global _presets_dirty
+
+    presets = _load()
+    if name not in presets:
+        return False
+
+    del presets[name]
+    _presets_dirty = True
+    _schedule_flush()
+    return True
+
+# -----------------------------------------------------------------------------
+# storage
+
+def _read_json(file):
+    # Returns (content, crc of the file) or (None, None)
+
+    try:
+        with open(file, 'r') as f:
+            text = f.read()
+        return (json.loads(text), binascii.crc32(text.encode()))
+    except (OSError, ValueError):
+        return (None, None)
+
+def _write_json(file, content, crc):
+    # Writes content unless the file already holds it, returns the new crc.
+    # The file is replaced by a rename, a reset while writing leaves the old
+    # content.
+
+    text = json.dumps(content)
+    new_crc = binascii.crc32(text.encode())
+    if new_crc == crc:
+        return crc
+
+    tmp = file + '.tmp'
+    with open(tmp, 'w') as f:
+        f.write(text)
+    os.rename(tmp, file)
+    return new_crc
+
+def flush():
+
+    global _scene_dirty, _scene_crc, _presets_dirty, _presets_crc
+
+    if _scene_dirty:
+        _scene_dirty = False
+        _scene_crc = _write_json(scene_file, capture(), _scene_crc)
+
+    if _presets_dirty:
+        _presets_dirty = False
+        _presets_crc = _write_json(presets_file, _presets, _presets_crc)
+
+def _schedule_flush():
+    # Every change pushes the flush back, so a burst of changes (e.g. dragging
+    # the color wheel) ends up in one write
+
+    global _flush_task, _flush_deadline
+
+    _flush_deadline = utime.ticks_add(utime.ticks_ms(), flush_delay_s * 1000)
+    if _flush_task is None:
+        _flush_task = asyncio.create_task(_flush_later())
+
+async def _flush_later():
+
+    global _flush_task
+
+    while True:
+        wait = utime.ticks_diff(_flush_deadline, utime.ticks_ms())
+        if wait <= 0:
+            break
+        await asyncio.sleep_ms(wait)
+
+    _flush_task = None
+    try:
+        flush()
+    except OSError as e:
+        print('presets: flush failed', e)
@@ -28,7 +28,9 @@ Usage:
 Returns a table mapping integer values 0-255 to brightness adjusted values
 in the range 0-42.  Parameters control both the table size (range of input
 values) and the range of output values.  All integers. Tables are cached
-to avoid recomputation.
+to avoid recomputation, optionally on disk:
+
+>>> pwm_lightness.set_cache_dir('pwm')
 
 >>> pwm_lightness.get_pwm_table(255, 255, 2)
 
@@ -44,12 +46,26 @@ To make temporal dithering work, cycle through a tuple within a loop, e.g:
 
 """
 
+import os
+from array import array
+
 try:
     from typing import Sequence
 except ImportError:
     pass
 
 _pwm_tables = {}  # Our cache.
+_cache_dir = None  # Directory of the disk cache, disabled by default.
+
+
+def set_cache_dir(path: str) -> None:
+    """Keeps computed tables as raw binary files in the directory path.
+
+    A table found there is loaded with a single readinto() instead of being
+    computed. Files are in the machine's byte order, None disables the cache.
+    """
+    global _cache_dir
+    _cache_dir = path
 
 
 def get_pwm_table(max_output: int,
@@ -58,41 +74,103 @@ def get_pwm_table(max_output: int,
        If dither_bits > 0, then returns a tuple of <2^dither_bits> tables used for temporal dithering.
        Temporal dithering is enabled only for 8-bit PWM
 
-    Computed upon the first call with given value, cached thereafter.
+    Computed upon the first call with given value (or loaded from the disk
+    cache, see set_cache_dir()), cached thereafter.
     """
     assert max_output > 0
     assert max_input > 0
     assert dither_bits <= 8 and dither_bits >= 0
 
-    table = _pwm_tables.get((max_output, max_input, dither_bits))
+    key = (max_output, max_input, dither_bits)
+    table = _pwm_tables.get(key)
     if table:
         return table
 
-    if dither_bits > 0 and max_output == 255:
-        dither_steps = pow(2, dither_bits)
-        table = [None] * dither_steps
+    dithered = dither_bits > 0 and max_output == 255
+    size = max_input + 1
+    layers = 1 << dither_bits if dithered else 1
 
-        for i in range(dither_steps):
-            # Ordered dithering threshold (interleave the bits of dither steps in reverse order)
-            dither = sum(tuple(((i >> (dither_bits - bit - 1)) & 1) << bit
-                     for bit in range(dither_bits))) << (8 - dither_bits)
+    if max_output <= 255:
+        buf = bytearray(layers * size)
+        nbytes = len(buf)
+    else:
+        typecode = 'H' if max_output <= 0xffff else 'I'
+        buf = array(typecode, [0] * size)
+        nbytes = size * (2 if typecode == 'H' else 4)
+
+    if not _load_table(key, buf, nbytes):
+        if dithered:
+            _fill_dithered(buf, max_input, dither_bits)
+        else:
+            for l_star in range(size):
+                buf[l_star] = round(_cie1931(l_star/max_input) * max_output)
+        _store_table(key, buf)
+
+    if dithered:
+        view = memoryview(buf)
+        table = tuple(view[i*size:(i+1)*size] for i in range(layers))
+    else:
+        table = buf
 
-            value_gen = (min(255, (round(_cie1931(l_star/max_input) * max_output * 256) + dither)//256)
-                        for l_star in range(max_input+1))
+    _pwm_tables[key] = table
+    return table
 
-            table[i] = bytes(value_gen) if max_output <= 255 else tuple(value_gen)
-    else:
-        value_gen = (round(_cie1931(l_star/max_input) * max_output)
-                    for l_star in range(max_input+1))
 
-        table = bytes(value_gen) if max_output <= 255 else tuple(value_gen)
+def _fill_dithered(buf: bytearray, max_input: int, dither_bits: int) -> None:
+    """Fills buf with the 2^dither_bits layers of an 8-bit table.
 
-    _pwm_tables[(max_output, max_input, dither_bits)] = table
-    return table
+    The curve is evaluated once in 8.8 fixed point, the layers only differ
+    in the threshold added before dropping the fraction.
+    """
+    size = max_input + 1
+    base = [round(_cie1931(l_star/max_input) * 255 * 256) for l_star in range(size)]
+
+    for i in range(1 << dither_bits):
+        # Ordered dithering threshold (interleave the bits of dither steps in reverse order)
+        dither = 0
+        for bit in range(dither_bits):
+            dither |= ((i >> bit) & 1) << (dither_bits - bit - 1)
+        dither <<= 8 - dither_bits
+
+        offset = i * size
+        for l_star in range(size):
+            buf[offset + l_star] = min(255, (base[l_star] + dither)//256)
+
+
+def _cache_file(key) -> str:
+    return '{}/pwm_{}_{}_{}.bin'.format(_cache_dir, *key)
+
+
+def _load_table(key, buf, nbytes: int) -> bool:
+    """Reads the cached table into buf, returns False if there is none."""
+    if _cache_dir is None:
+        return False
+    try:
+        with open(_cache_file(key), 'rb') as f:
+            return f.readinto(buf) == nbytes and not f.read(1)
+    except OSError:
+        return False
+
+
+def _store_table(key, buf) -> None:
+    if _cache_dir is None:
+        return
+    try:
+        try:
+            os.mkdir(_cache_dir)
+        except OSError:
+            pass  # Exists already.
+        with open(_cache_file(key), 'wb') as f:
+            f.write(buf)
+    except OSError:
+        pass  # A read-only or full filesystem only costs the next boot time.
 
 
 def clear_table_cache():
-    """Empties the cache of get_pwm_tables() return values."""
+    """Empties the cache of get_pwm_tables() return values.
+
+    Files in the disk cache are kept.
+    """
     _pwm_tables.clear()
 
 
@@ -20,7 +20,14 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
 
-"""
+"""Small pseudo random numbers that never allocate.
+
+A multiply-with-carry generator: every step computes
+x = A * (x & 0xffff) + (x >> 16) and yields the low 16 bits. The state stays
+below 2^30, a small int on every MicroPython port, so drawing numbers does not
+touch the heap. A * 2^16 - 1 is a safe prime, the period is about 5.4e8
+steps. Seeded from urandom at import, not for cryptography.
+
 usage:
 >>> from random import randint
 >>> randint(1,100)
@@ -29,23 +36,123 @@ usage:
 >>> mylist = ['Paris','London','Roma','Rio']
 >>> choice(mylist)
 'Roma'
+>>> from random import fill
+>>> buf = bytearray(60)
+>>> fill(buf, 0, 50)
 """
 
-import sys
 import urandom
 
-def _rescale(Nmin, Nmax, OldValue):
-    NewRange = Nmax - Nmin  
-    NewValue = OldValue * NewRange / sys.maxsize + Nmin
-    return NewValue
+_A = 16380
+_x = 1
+
+def seed(n):
+
+    global _x
+    # 0 and A * 2^16 - 1 are fixed points
+    _x = n % ((_A << 16) - 2) + 1
+
+def getrandbits(n):
+    # Up to 16 bits
+
+    global _x
+    x = _A * (_x & 0xffff) + (_x >> 16)
+    _x = x
+    return (x & 0xffff) >> (16 - n)
+
+def _below(n):
+    # Uniform integer in 0 <= N < n, n up to 2^29. Draws in the biased tail
+    # of the 16 or 29 bit range are rejected.
+
+    global _x
+    a = _A
+    x = _x
+
+    if n <= 0x10000:
+        limit = 0x10000 - 0x10000 % n
+        while True:
+            x = a * (x & 0xffff) + (x >> 16)
+            r = x & 0xffff
+            if r < limit:
+                _x = x
+                return r % n
+
+    if n > 1 << 29:
+        raise ValueError('range')
+
+    limit = (1 << 29) - (1 << 29) % n
+    while True:
+        x = a * (x & 0xffff) + (x >> 16)
+        r = (x & 0xffff) << 13
+        x = a * (x & 0xffff) + (x >> 16)
+        r |= (x & 0xffff) >> 3
+        if r < limit:
+            _x = x
+            return r % n
 
 # Return a random integer N such that Nmin <= N <= Nmax.
 def randint(Nmin, Nmax):
-    Oldint = urandom.getrandbits(31)
-    N = round(_rescale(Nmin-0.5, Nmax+0.5, Oldint))
-    return N
+
+    if Nmax < Nmin:
+        raise ValueError('range')
+    return Nmin + _below(Nmax - Nmin + 1)
+
+# Return a random integer N such that start <= N < stop.
+def randrange(start, stop = None):
+
+    if stop is None:
+        (start, stop) = (0, start)
+    if stop <= start:
+        raise ValueError('range')
+    return start + _below(stop - start)
 
 # Return a random element from a list.
 def choice(mylist):
-    index = randint(0,len(mylist)-1)
-    return mylist[index]
\ No newline at end of file
+
+    return mylist[_below(len(mylist))]
+
+def fill(buf, lo, hi):
+    # Writes random integers lo <= N <= hi to every element of buf, up to
+    # 65536 values. Ranges dividing 256 (e.g. whole bytes) take two values
+    # from every step.
+
+    global _x
+
+    n = hi - lo + 1
+    if n < 1 or n > 0x10000:
+        raise ValueError('range')
+
+    a = _A
+    x = _x
+    end = len(buf)
+    i = 0
+
+    if 256 % n == 0:
+        mask = n - 1
+        # for/range loops compile to a counter, whole bytes skip the add
+        if lo == 0:
+            for i in range(0, end - 1, 2):
+                x = a * (x & 0xffff) + (x >> 16)
+                buf[i] = x & mask
+                buf[i + 1] = (x >> 8) & mask
+        else:
+            for i in range(0, end - 1, 2):
+                x = a * (x & 0xffff) + (x >> 16)
+                buf[i] = lo + (x & mask)
+                buf[i + 1] = lo + ((x >> 8) & mask)
+        if end & 1:
+            x = a * (x & 0xffff) + (x >> 16)
+            buf[end - 1] = lo + (x & mask)
+        _x = x
+        return
+
+    limit = 0x10000 - 0x10000 % n
+    while i < end:
+        x = a * (x & 0xffff) + (x >> 16)
+        r = x & 0xffff
+        if r < limit:
+            buf[i] = lo + r % n
+            i += 1
+    _x = x
+
+seed(urandom.getrandbits(30))
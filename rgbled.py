@@ -1,78 +1,20 @@
-import math
-import random
-import pwm_lightness
-from machine import Pin, PWM
+import cie_tables
+from array import array
+from machine import Pin
 from neopixel import NeoPixel
 
 # -----------------------------------------------------------------------------
 # CIE 1931 LUTs
 
+# the strip tables of 8 bits and main.STRIP_DEPTH are baked in
+# (tools/build_mpy.py), the PWM table is only computed if the PWM LED is used
 _cie_lut_10b = None
-_cie_lut_8b = None
+_cie_lut_8b = cie_tables.STRIP_8B
 
 # -----------------------------------------------------------------------------
-# color transformations
-
-def _hsv2rgb(h, s, v):
-    # This version below is ~3x slower but ~3x shorter ;)
-    # k = lambda n: math.fmod((n + h / 60.0), 6)
-    # f = lambda n: v - v * s * max(0, min(min(k(n), 4 - k(n)), 1))
-    # return round(f(5) * 255), round(f(3) * 255), round(f(1) * 255)
-
-    c = v * s
-    hp = h / 60.0
-    x = c * (1 - math.fabs(math.fmod(hp, 2) - 1))
-    m = v - c
-    x = round(255 * (x + m))
-    c = round(255 * (c + m))
-    m = round(255 * m)
-    hp = int(hp) % 6
-    if hp == 0:
-        return c, x, m
-    elif hp == 1:
-        return x, c, m
-    elif hp == 2:
-        return m, c, x
-    elif hp == 3:
-        return m, x, c
-    elif hp == 4:
-        return x, m, c
-    elif hp == 5:
-        return c, m, x
-
-def _rgb2hsv(r, g, b):
-
-    r /= 255
-    g /= 255
-    b /= 255
-
-    maxc = max(r, g, b)
-    minc = min(r, g, b)
-    v = maxc
-
-    if minc == maxc:
-        return 0.0, 0.0, v
-
-    s = (maxc-minc) / maxc
-    rc = (maxc-r) / (maxc-minc)
-    gc = (maxc-g) / (maxc-minc)
-    bc = (maxc-b) / (maxc-minc)
-    if r == maxc:
-        h = bc-gc
-    elif g == maxc:
-        h = 2.0+rc-bc
-    else:
-        h = 4.0+gc-rc
-    h = (h/6.0) % 1.0
-
-    return h * 360.0, s, v
+# colors
 
 _rgb_next_color = bytearray(3)
-_rgb_curr_color = bytearray(3)
-
-def get_color():
-
-    return _rgb_curr_color
 
 def get_next_color():
 
@@ -94,6 +36,11 @@ def init(rpin, gpin, bpin):
 
     global _rpwm, _gpwm, _bpwm, _cie_lut_10b
 
+    import pwm_lightness
+    from machine import PWM
+
+    # computed once, loaded from flash on later boots
+    pwm_lightness.set_cache_dir('pwm')
     _cie_lut_10b = pwm_lightness.get_pwm_table(1023, 255)
 
     _rpwm = PWM(Pin(rpin), freq=500, duty=0)
@@ -102,141 +49,111 @@ def init(rpin, gpin, bpin):
 
 def set(r, g, b):
 
-    global _rgb_curr_color
-
     cie = _cie_lut_10b
     _rpwm.duty(cie[r])
     _gpwm.duty(cie[g])
     _bpwm.duty(cie[b])
-    _rgb_curr_color = bytearray((r, g, b))
 
 # -----------------------------------------------------------------------------
 # RGB LED strip
 
 _led_strip_drv = None
 
-def strip_init(pin, leds):
+# With a depth over 8 bits effects render linear intensities of depth bits
+# into an array frame, strip_dither() quantizes it into the driver's buffer
+# with an ordered dither that changes every frame. 255 << (depth - 8) is full
+# brightness, so the dithered value never exceeds 255.
+_depth = 8
+_frame = None
+_cie_lut_strip = None
+_dither_thresholds = None
+_dither_step = 0
+
+def strip_init(pin, leds, depth = 8):
 
-    global _led_strip_drv, _cie_lut_8b
+    global _led_strip_drv, _depth, _frame, _cie_lut_strip, _dither_thresholds, _dither_step
 
-    _cie_lut_8b = pwm_lightness.get_pwm_table(255, 255, 2)
+    if depth < 8 or depth > 16:
+        raise ValueError('depth')
 
     _led_strip_drv = NeoPixel(Pin(pin, Pin.OUT), leds)
     _led_strip_drv.fill((0, 0, 0))
     _led_strip_drv.write()
 
-def strip_set(r, g, b):
-
-    drv = _led_strip_drv
-    cie = _cie_lut_8b[0]
-
-    global _rgb_curr_color
-
-    drv.fill((cie[r], cie[g], cie[b]))
-    drv.write()
-    _rgb_curr_color = bytearray((r, g, b))
-
-def strip_set_smooth(r, g, b):
-
-    drv = _led_strip_drv
-    cie = _cie_lut_8b[0]
-
-    global _rgb_curr_color
-    prev_color = _rgb_curr_color
-    new_color = bytearray((r, g, b))
-
-    if new_color == prev_color:
-        strip_set(r, g, b)
+    _depth = depth
+    _dither_step = 0
+    if depth == 8:
+        _frame = _led_strip_drv.buf
+        _cie_lut_strip = _cie_lut_8b
         return
 
-    diff = (new_color[0] - prev_color[0], new_color[1] - prev_color[1], new_color[2] - prev_color[2])
-    length = math.sqrt(diff[0] ** 2 + diff[1] ** 2 + diff[2] ** 2)
-
-    cosb_sina = diff[0] / length
-    cosb_cosa = diff[1] / length
-    sinb = diff[2] / length
+    bits = depth - 8
+    table = getattr(cie_tables, 'STRIP_{}B'.format(depth), None)
+    if table is not None:
+        table = array('H', (table[i] | table[i + 1] << 8 for i in range(0, len(table), 2)))
+    else:
+        # the build only bakes the table of main.STRIP_DEPTH
+        import pwm_lightness
+        pwm_lightness.set_cache_dir('pwm')
+        table = pwm_lightness.get_pwm_table(255 << bits, 255)
+    _cie_lut_strip = (table,)
+    _frame = new_frame(len(_led_strip_drv.buf))
 
-    steps = range(1, int(round(length)) + 1)
-    for step in steps:
-        new_color[0] = int(prev_color[0] + round(step * cosb_sina))
-        new_color[1] = int(prev_color[1] + round(step * cosb_cosa))
-        new_color[2] = int(prev_color[2] + round(step * sinb))
-        drv.fill((cie[new_color[0]], cie[new_color[1]], cie[new_color[2]]))
-        drv.write()
-    _rgb_curr_color = new_color
+    # ordered dithering thresholds (the bits of the step in reverse order)
+    _dither_thresholds = bytearray(1 << bits)
+    for i in range(1 << bits):
+        t = 0
+        for bit in range(bits):
+            t |= ((i >> bit) & 1) << (bits - bit - 1)
+        _dither_thresholds[i] = t
 
-# -----------------------------------------------------------------------------
-# RGB LED strip effects
+def strip_dither():
+    # Quantizes the frame to the driver's buffer. Neighbouring bytes start at
+    # different thresholds, so the error is spread over space and time.
 
-_raibow_hue = 0
+    global _dither_step
 
-def strip_rainbow():
+    buf = _led_strip_drv.buf
+    frame = _frame
+    thresholds = _dither_thresholds
+    mask = len(thresholds) - 1
+    shift = _depth - 8
+    step = _dither_step
 
-    global _raibow_hue
-    drv = _led_strip_drv
-    cie = _cie_lut_8b[0]
-    leds = range(drv.n)
+    for i in range(len(buf)):
+        buf[i] = (frame[i] + thresholds[(step + i) & mask]) >> shift
 
-    hue_step = 360 / drv.n
+    _dither_step = (step + 1) & mask
 
-    for led in leds:
-        led_hue = (_raibow_hue + hue_step * led) % 360
-        drv[led] = tuple(cie[x] for x in _hsv2rgb(led_hue, 1.0, 1.0))
-    drv.write()
+def strip_write():
 
-    _raibow_hue += 1
-
-def strip_fire():
+    _led_strip_drv.write()
 
-    drv = _led_strip_drv
-    cie = _cie_lut_8b[0]
-    leds = range(drv.n)
+def strip_frame():
+    # Effects render into this, the driver's buffer at 8 bits depth
 
-    # color of fire
-    rgb = (217, 109, 0)
+    return _frame
 
-    for led in leds:
-        flicker = random.randint(0, 50)
-        drv[led] = tuple(cie[x - flicker] if x-flicker >= 0 else 0 for x in rgb)
-    drv.write()
+def strip_bpp():
 
-_breathe_max_value = None
-_breathe_min_value = None
-_breathe_step = None
-_breathe_step_value = 0.002
-_breathe_hsv = None
-_breathe_dither = 0
+    return _led_strip_drv.bpp
 
-def strip_breathe_setup(r, g, b, intensity = 0.5):
+def strip_cie_lut():
+    # CIE corrected tables to the frame depth, one per temporal dithering
+    # layer at 8 bits (the dithering stage does it at other depths)
 
-    global _rgb_curr_color
-    global _breathe_max_value, _breathe_min_value, _breathe_step, _breathe_hsv, _breathe_value
+    return _cie_lut_strip
 
-    _rgb_curr_color = bytearray((r, g, b))
-    _breathe_hsv = _rgb2hsv(r, g, b)
-    _breathe_max_value = _breathe_hsv[2]
-    _breathe_min_value = (1 - intensity) * _breathe_max_value
-    _breathe_value = _breathe_min_value
-    _breathe_step = _breathe_step_value * _breathe_max_value
+def new_frame(n):
+    # Returns n zeroed frame values
 
-def strip_breathe():
+    return bytearray(n) if _depth == 8 else array('H', [0] * n)
 
-    global _breathe_step
-    global _breathe_hsv
-    global _breathe_value
-    global _breathe_dither
+def frame_pixel(rgb):
+    # Returns the frame values of one pixel in the strip's color order
 
     drv = _led_strip_drv
-    cie = _cie_lut_8b
-
-    if _breathe_value <= _breathe_min_value:
-        _breathe_step  = _breathe_step_value * _breathe_max_value
-    elif _breathe_value >= _breathe_max_value - _breathe_step:
-        _breathe_step = -_breathe_step_value * _breathe_min_value
-
-    _breathe_value += _breathe_step
-    _breathe_dither = 0 if _breathe_dither == 3 else _breathe_dither + 1
-
-    # using temporal dithering to minimize flicker at low light intensity
-    drv.fill(tuple(cie[_breathe_dither][x] for x in _hsv2rgb(_breathe_hsv[0], _breathe_hsv[1], _breathe_value)))
-    drv.write()
+    pixel = new_frame(drv.bpp)
+    for i in range(3):
+        pixel[drv.ORDER[i]] = rgb[i]
+    return pixel
@@ -0,0 +1,126 @@
+# -----------------------------------------------------------------------------
+# imports
+
+import utime
+import metrics
+import uasyncio as asyncio
+
+# -----------------------------------------------------------------------------
+# configuration
+
+# Frames are ticked at target_fps. A frame that runs over its slot drops the
+# slots it missed instead of catching up, and every frame leaves at least
+# min_idle_ms to other tasks, so HTTP latency stays bounded for any effect.
+target_fps = 50
+min_idle_ms = 5
+
+_render = None
+_write = None
+_dither = None
+
+def init(write, fps = None, dither = None):
+    # write() sends the rendered frame to the strip. dither() quantizes the
+    # frame for write(), a temporal dither changes the output of an unchanged
+    # frame, so with dither every frame is written.
+
+    global _write, _dither, target_fps
+
+    _write = write
+    _dither = dither
+    if fps:
+        target_fps = fps
+
+def set_render(render):
+    # render(t_ms) draws the frame for ticks_ms() t_ms and returns True if it
+    # changed
+
+    global _render
+    _render = render
+
+# -----------------------------------------------------------------------------
+# statistics
+
+frames = 0
+frames_written = 0
+frames_dropped = 0
+render_us = 0
+render_us_max = 0
+write_us = 0
+write_us_max = 0
+dither_us = 0
+dither_us_max = 0
+
+# frame times in microseconds
+_render_time = metrics.Histogram('animation_render_seconds', (250, 500, 1000, 2000, 5000, 10000, 20000), 1000000,
+                                 'time to render a frame')
+_write_time = metrics.Histogram('animation_write_seconds', (250, 500, 1000, 2000, 5000, 10000, 20000), 1000000,
+                                'time to write a frame to the strip')
+_dither_time = metrics.Histogram('animation_dither_seconds', (250, 500, 1000, 2000, 5000, 10000, 20000), 1000000,
+                                 'time to dither a frame')
+
+def _collect_metrics(out):
+
+    metrics.counter(out, 'animation_frames_total', frames)
+    metrics.counter(out, 'animation_frames_written_total', frames_written)
+    metrics.counter(out, 'animation_frames_dropped_total', frames_dropped)
+    metrics.gauge(out, 'animation_render_max_seconds', render_us_max / 1000000)
+    metrics.gauge(out, 'animation_write_max_seconds', write_us_max / 1000000)
+    metrics.gauge(out, 'animation_dither_max_seconds', dither_us_max / 1000000)
+
+metrics.add_collector(_collect_metrics)
+
+# -----------------------------------------------------------------------------
+# task
+
+async def run():
+
+    global frames, frames_written, frames_dropped
+    global render_us, render_us_max, write_us, write_us_max, dither_us, dither_us_max
+
+    ticks_ms = utime.ticks_ms
+    ticks_us = utime.ticks_us
+    ticks_diff = utime.ticks_diff
+    ticks_add = utime.ticks_add
+
+    next_frame = ticks_ms()
+
+    while True:
+        frame_ms = 1000 // target_fps
+
+        if _render:
+            start = ticks_us()
+            changed = _render(ticks_ms())
+            render_us = ticks_diff(ticks_us(), start)
+            render_us_max = max(render_us_max, render_us)
+            _render_time.observe(render_us)
+
+            if _dither:
+                start = ticks_us()
+                _dither()
+                dither_us = ticks_diff(ticks_us(), start)
+                dither_us_max = max(dither_us_max, dither_us)
+                _dither_time.observe(dither_us)
+                changed = True
+
+            if changed:
+                start = ticks_us()
+                _write()
+                write_us = ticks_diff(ticks_us(), start)
+                write_us_max = max(write_us_max, write_us)
+                _write_time.observe(write_us)
+                frames_written += 1
+
+        frames += 1
+
+        # heap watermarks once a second
+        if frames % target_fps == 0:
+            metrics.sample_heap()
+
+        next_frame = ticks_add(next_frame, frame_ms)
+        late = ticks_diff(ticks_ms(), next_frame)
+        if late >= 0:
+            missed = late // frame_ms + 1
+            frames_dropped += missed
+            next_frame = ticks_add(next_frame, missed * frame_ms)
+
+        await asyncio.sleep_ms(max(min_idle_ms, ticks_diff(next_frame, ticks_ms())))
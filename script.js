@@ -3,6 +3,8 @@ var colorPicker
 var oneSecondInterval
 var shutDownDate = 0
 var serverTimerSeconds = 0
+var colorSocket = null
+var colorSocketLastSend = 0
 
 window.onload = function() {
 	calcPageLook()
@@ -19,8 +21,19 @@ window.onload = function() {
 		setEffectBtnColor(color)
 	});
 
+	// Stream the color while dragging, at most ~30 updates per second
+	colorPicker.on("input:change",
+	function(color) {
+		if (Date.now() - colorSocketLastSend >= 33) {
+			sendColorFrame(color)
+		}
+	})
+
 	colorPicker.on("input:end",
 	function(color) {
+		if (sendColorFrame(color)) {
+			return
+		}
 		fetch("/color", {
 			method: "POST",
 			headers: {"Content-Type": "application/json"},
@@ -40,6 +53,22 @@ window.onload = function() {
 		timerHandler()
 	})
 
+	// Follow changes made by other clients
+	// Example event: {"effect":"rainbow"}
+	var events = new EventSource("/events")
+	events.onmessage = function(event) {
+		const data = JSON.parse(event.data)
+		if (data.color !== undefined) {
+			colorPicker.color.set(data.color)
+		}
+		if (data.effect !== undefined) {
+			toggleEffectBtn(data.effect)
+		}
+		if (data.timer !== undefined) {
+			syncTimer(data.timer)
+		}
+	}
+
 	// Update the shut down timer
 	var timerValue = document.getElementById("timer-value")
 	var sliderInput = document.getElementById("timer-slider")
@@ -48,6 +77,26 @@ window.onload = function() {
 	sliderInput.addEventListener("input", (event) => { timerValue.textContent = event.target.value })
 }
 
+function openColorSocket() {
+	colorSocket = new WebSocket("ws://" + window.location.host + "/ws")
+	colorSocket.binaryType = "arraybuffer"
+	colorSocket.onclose = function() { colorSocket = null }
+}
+
+function sendColorFrame(color) {
+	// Binary frame: r, g, b (see main.apply_control_frame)
+	if (colorSocket == null) {
+		openColorSocket()
+		return false
+	}
+	if (colorSocket.readyState != WebSocket.OPEN) {
+		return false
+	}
+	colorSocket.send(new Uint8Array([color.rgb.r, color.rgb.g, color.rgb.b]))
+	colorSocketLastSend = Date.now()
+	return true
+}
+
 window.addEventListener("orientationchange",
 function ()
 {
@@ -82,22 +131,32 @@ function runEffect(effectName) {
 	})
 }
 
+function clearTimer() {
+	clearInterval(oneSecondInterval)
+	serverTimerSeconds = 0
+	shutDownDate = 0
+	document.getElementById("timer-button-icon").className = "bi bi-clock"
+	document.getElementById("timer-value").textContent = 0
+	var slider = document.getElementById("timer-slider")
+	slider.disabled = false
+	slider.step = 5
+	slider.value = 0
+}
+
+function syncTimer(seconds) {
+	// Mirror the server timer without posting it back
+	clearTimer()
+	if (seconds > 0) {
+		serverTimerSeconds = seconds
+		timerHandler()
+	}
+}
+
 function timerHandler() {
 	var icon = document.getElementById("timer-button-icon")
 	var slider = document.getElementById("timer-slider")
 	var time = document.getElementById("timer-value")
 
-	function clearTimer() {
-		clearInterval(oneSecondInterval)
-		serverTimerSeconds = 0
-		shutDownDate = 0
-		icon.className = "bi bi-clock"
-		time.textContent = 0
-		slider.disabled = false
-		slider.step = 5
-		slider.value = 0
-	}
-
 	function setTimerOnServer(timerValueSeconds) {
 		fetch("/timer", {
 			method: "POST",
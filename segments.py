@@ -0,0 +1,244 @@
+# -----------------------------------------------------------------------------
+# imports
+
+import effects
+
+# -----------------------------------------------------------------------------
+# segments
+
+# A segment is a named run of pixels on the strip with its own effect and
+# color. Effects render straight into the segment's slice of the strip's
+# frame, reversed segments render into a scratch buffer that is copied in
+# pixel by pixel. Segments never overlap, pixels not covered by any are off.
+
+class Segment:
+
+    def __init__(self, name, start, length, reverse = False):
+
+        self.name = name
+        self.start = start
+        self.length = length
+        self.reverse = bool(reverse)
+        self.color = bytearray(3)
+        self.shown = bytearray(3)
+        self.effect = None
+        self.effect_name = ''
+        self._effects = {}
+        self._view = None
+        self._scratch = None
+
+    def _bind(self, strip_buf, bpp):
+
+        self._view = memoryview(strip_buf)[self.start * bpp:(self.start + self.length) * bpp]
+        self._scratch = None
+        if self.reverse:
+            # a copy keeps the frame's value type, effects draw over it
+            self._scratch = memoryview(strip_buf[self.start * bpp:(self.start + self.length) * bpp])
+
+    def set_effect(self, name, params = None):
+        # Switches to the named effect and/or applies its params, raises
+        # KeyError for an unknown effect and ValueError for invalid params
+
+        instance = self._effects.get(name)
+        if instance is None:
+            instance = effects.create(name, self.shown)
+            self._effects[name] = instance
+
+        if name == self.effect_name:
+            if params:
+                instance.setup(params)
+            return
+
+        instance.setup(params or {})
+        # let the new effect pick up the segment color
+        instance.set_color(self.color)
+
+        self.effect = instance
+        self.effect_name = name
+
+    def set_color(self, r, g, b):
+
+        c = self.color
+        c[0] = r
+        c[1] = g
+        c[2] = b
+        if self.effect:
+            self.effect.set_color(c)
+
+    def effect_instances(self):
+        # The effects used so far by name
+
+        return self._effects
+
+    def redraw(self):
+        # Makes the effect draw again, e.g. after the strip buffer was cleared
+
+        if self.effect:
+            self.effect.setup({})
+            self.effect.set_color(self.color)
+
+    def render(self, t):
+
+        if not self.effect:
+            return False
+
+        if not self.reverse:
+            return self.effect.render(self._view, t)
+
+        scratch = self._scratch
+        if not self.effect.render(scratch, t):
+            return False
+
+        view = self._view
+        bpp = len(scratch) // self.length
+        end = len(scratch) - bpp
+        for i in range(0, len(scratch), bpp):
+            j = end - i
+            for k in range(bpp):
+                view[j + k] = scratch[i + k]
+        return True
+
+    def state(self):
+
+        c = self.color
+        return {
+            'name': self.name,
+            'start': self.start,
+            'length': self.length,
+            'reverse': self.reverse,
+            'color': {'r':c[0],'g':c[1],'b':c[2]},
+            'effect': self.effect_name,
+            'params': self.effect.params if self.effect else {}
+        }
+
+# -----------------------------------------------------------------------------
+# layout
+
+max_segments = 8
+
+_segments = []
+_strip_buf = None
+_bpp = 3
+_leds = 0
+_cleared = False
+
+def init(strip_buf, bpp):
+    # Starts with one segment named 'main' spanning the whole strip
+
+    global _strip_buf, _bpp, _leds
+
+    _strip_buf = strip_buf
+    _bpp = bpp
+    _leds = len(strip_buf) // bpp
+    _segments.clear()
+    set_segment('main', 0, _leds)
+
+def get_all():
+
+    return _segments
+
+def get(name):
+    # Returns the segment or None
+
+    for segment in _segments:
+        if segment.name == name:
+            return segment
+    return None
+
+def _check_bounds(name, start, length, others):
+    # others are (name, start, length) of the segments to stay clear of
+
+    if not isinstance(start, int) or not isinstance(length, int):
+        raise ValueError('bounds')
+    if start < 0 or length < 1 or start + length > _leds:
+        raise ValueError('bounds')
+
+    for (other_name, other_start, other_length) in others:
+        if other_name != name and start < other_start + other_length and other_start < start + length:
+            raise ValueError('overlap')
+
+def _place(name, start, length, reverse):
+    # Returns the segment at its new place, existing segments keep their
+    # effects and colors
+
+    segment = get(name)
+    if segment is None:
+        segment = Segment(name, start, length, reverse)
+        segment.set_effect('color')
+    else:
+        segment.start = start
+        segment.length = length
+        segment.reverse = bool(reverse)
+
+    segment._bind(_strip_buf, _bpp)
+    return segment
+
+def set_segment(name, start, length, reverse = False):
+    # Creates the segment or moves an existing one, raises ValueError if it
+    # does not fit the strip or overlaps another
+
+    _check_bounds(name, start, length, [(s.name, s.start, s.length) for s in _segments])
+
+    if get(name) is None and len(_segments) >= max_segments:
+        raise ValueError('too many segments')
+
+    segment = _place(name, start, length, reverse)
+    if segment not in _segments:
+        _segments.append(segment)
+    _relayout()
+    return segment
+
+def set_layout(layout):
+    # Replaces all segments at once with (name, start, length, reverse)
+    # tuples, segments of the same name keep their effects and colors
+
+    if len(layout) > max_segments:
+        raise ValueError('too many segments')
+
+    for i in range(len(layout)):
+        (name, start, length, reverse) = layout[i]
+        for other in layout[:i]:
+            if other[0] == name:
+                raise ValueError('duplicate')
+        _check_bounds(name, start, length, [other[:3] for other in layout[:i]])
+
+    _segments[:] = [_place(name, start, length, reverse) for (name, start, length, reverse) in layout]
+    _relayout()
+
+def remove(name):
+    # Returns False if there is no such segment
+
+    segment = get(name)
+    if segment is None:
+        return False
+
+    _segments.remove(segment)
+    _relayout()
+    return True
+
+def _relayout():
+    # Clears the strip and lets every segment draw its pixels again
+
+    global _cleared
+
+    _cleared = True
+    buf = _strip_buf
+    for i in range(len(buf)):
+        buf[i] = 0
+    for segment in _segments:
+        segment.redraw()
+
+# -----------------------------------------------------------------------------
+# rendering
+
+def render(t):
+    # Frame scheduler render function, all segments share one write()
+
+    global _cleared
+
+    changed = _cleared
+    _cleared = False
+    for segment in _segments:
+        if segment.render(t):
+            changed = True
+    return changed
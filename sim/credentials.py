@@ -0,0 +1,5 @@
+# Credentials of the simulated device, the WLAN accepts any network
+wifi_ssid = 'sim'
+wifi_pwd = 'sim'
+usr_name = 'admin'
+usr_pwd = 'secret'
@@ -0,0 +1,13 @@
+# Stand-in for the MicroPython esp module
+
+def osdebug(level):
+
+    pass
+
+def flash_size():
+
+    return 4 * 1024 * 1024
+
+def freemem():
+
+    return 40 * 1024
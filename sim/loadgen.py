@@ -0,0 +1,173 @@
+# Load generator for the firmware, simulated or on a device.
+#
+#   python3 sim/loadgen.py [--clients 3] [--seconds 10] [--effect rainbow]
+#                          [--host 127.0.0.1] [--port 8080] [--spawn]
+#
+# Every client keeps one connection open and sends a mix of GET /state and
+# POST /color requests back to back, reconnecting whenever the server closes.
+# Reports requests per second, p50/p99 latency, response status counts and the
+# frames per second the animation scheduler wrote meanwhile (from /metrics).
+# --spawn starts sim/run.py on the port first.
+
+import os
+import sys
+import time
+import base64
+import random
+import asyncio
+import argparse
+import subprocess
+
+_requests = (
+    ('GET', '/state', b''),
+    ('POST', '/color', None)
+)
+
+class Client:
+
+    def __init__(self, host, port, auth):
+
+        self.host = host
+        self.port = port
+        self.auth = auth
+        self.reader = None
+        self.writer = None
+
+    async def request(self, method, path, body = b''):
+        # Returns (status, body), reconnects if needed
+
+        if self.writer is None:
+            (self.reader, self.writer) = await asyncio.open_connection(self.host, self.port)
+
+        head = '{} {} HTTP/1.1\r\nHost: {}\r\nAuthorization: Basic {}\r\nContent-Length: {}\r\n\r\n'.format(
+            method, path, self.host, self.auth, len(body))
+        self.writer.write(head.encode() + body)
+
+        status_line = await self.reader.readline()
+        if not status_line:
+            await self.close()
+            raise ConnectionError('closed')
+        status = int(status_line.split()[1])
+
+        length = 0
+        close = False
+        while True:
+            line = await self.reader.readline()
+            if line in (b'\r\n', b''):
+                break
+            (name, _, value) = line.decode().partition(':')
+            name = name.strip().lower()
+            if name == 'content-length':
+                length = int(value)
+            elif name == 'connection' and value.strip().lower() == 'close':
+                close = True
+
+        data = await self.reader.readexactly(length) if length else b''
+        if close:
+            await self.close()
+        return (status, data)
+
+    async def close(self):
+
+        if self.writer is not None:
+            self.writer.close()
+            try:
+                await self.writer.wait_closed()
+            except OSError:
+                pass
+        self.writer = None
+
+async def _worker(client, deadline, latencies, statuses):
+
+    i = 0
+    while time.monotonic() < deadline:
+        (method, path, body) = _requests[i % len(_requests)]
+        i += 1
+        if body is None:
+            body = '{{"r":{},"g":{},"b":{}}}'.format(*(random.randrange(256) for _ in range(3))).encode()
+
+        start = time.monotonic()
+        try:
+            (status, _) = await client.request(method, path, body)
+        except (OSError, ConnectionError, asyncio.IncompleteReadError):
+            await client.close()
+            statuses['error'] = statuses.get('error', 0) + 1
+            await asyncio.sleep(0.05)
+            continue
+        latencies.append(time.monotonic() - start)
+        statuses[status] = statuses.get(status, 0) + 1
+
+    await client.close()
+
+async def _frames_written(client):
+    # animation_frames_written_total from /metrics, or None
+
+    (status, body) = await client.request('GET', '/metrics')
+    for line in body.decode().splitlines():
+        if line.startswith('animation_frames_written_total '):
+            return int(line.split()[1])
+    return None
+
+def _percentile(values, p):
+
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+async def run(args):
+
+    auth = base64.b64encode('{}:{}'.format(args.user, args.password).encode()).decode()
+    control = Client(args.host, args.port, auth)
+
+    if args.effect:
+        await control.request('POST', '/effect', '{{"effect":"{}"}}'.format(args.effect).encode())
+    frames_before = await _frames_written(control)
+    await control.close()
+
+    latencies = []
+    statuses = {}
+    start = time.monotonic()
+    deadline = start + args.seconds
+    await asyncio.gather(*(_worker(Client(args.host, args.port, auth), deadline, latencies, statuses)
+                           for _ in range(args.clients)))
+    elapsed = time.monotonic() - start
+
+    frames_after = await _frames_written(control)
+    await control.close()
+
+    latencies.sort()
+    print('clients        {}'.format(args.clients))
+    print('requests       {} in {:.1f} s, {:.1f} req/s'.format(len(latencies), elapsed, len(latencies) / elapsed))
+    if latencies:
+        print('latency        p50 {:.1f} ms, p99 {:.1f} ms, max {:.1f} ms'.format(
+            _percentile(latencies, 50) * 1000, _percentile(latencies, 99) * 1000, latencies[-1] * 1000))
+    print('status         {}'.format(', '.join('{}: {}'.format(k, v) for (k, v) in sorted(statuses.items(), key = str))))
+    if frames_before is not None and frames_after is not None:
+        print('frames written {:.1f} fps'.format((frames_after - frames_before) / elapsed))
+
+def main():
+
+    parser = argparse.ArgumentParser(description = 'HTTP load generator for the LED controller')
+    parser.add_argument('--host', default = '127.0.0.1')
+    parser.add_argument('--port', type = int, default = 8080)
+    parser.add_argument('--clients', type = int, default = 3)
+    parser.add_argument('--seconds', type = float, default = 10)
+    parser.add_argument('--effect', help = 'effect to run during the test, e.g. rainbow')
+    parser.add_argument('--user', default = 'admin')
+    parser.add_argument('--password', default = 'secret')
+    parser.add_argument('--spawn', action = 'store_true', help = 'start sim/run.py first')
+    args = parser.parse_args()
+
+    sim = None
+    if args.spawn:
+        run_py = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'run.py')
+        sim = subprocess.Popen([sys.executable, run_py, str(args.port)])
+        time.sleep(1.5)
+
+    try:
+        asyncio.run(run(args))
+    finally:
+        if sim:
+            sim.terminate()
+            sim.wait()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+# Stand-in for the MicroPython machine module. Pins and PWM keep their state
+# so it can be inspected, Timer callbacks run on the asyncio event loop.
+
+import asyncio
+
+def freq(hz = None):
+
+    pass
+
+def reset():
+
+    raise SystemExit('machine.reset()')
+
+def unique_id():
+
+    return b'\x00\x00\x00\x00'
+
+class Pin:
+
+    IN = 0
+    OUT = 1
+
+    def __init__(self, pin, mode = -1, pull = -1, value = None):
+
+        self.pin = pin
+        self.mode = mode
+        self._value = value or 0
+
+    def value(self, *args):
+
+        if args:
+            self._value = 1 if args[0] else 0
+        return self._value
+
+    def on(self):
+
+        self._value = 1
+
+    def off(self):
+
+        self._value = 0
+
+class PWM:
+
+    def __init__(self, pin, freq = 0, duty = 0):
+
+        self.pin = pin
+        self._freq = freq
+        self._duty = duty
+
+    def freq(self, *args):
+
+        if args:
+            self._freq = args[0]
+        return self._freq
+
+    def duty(self, *args):
+
+        if args:
+            self._duty = args[0]
+        return self._duty
+
+class Timer:
+
+    ONE_SHOT = 0
+    PERIODIC = 1
+
+    def __init__(self, id = -1):
+
+        self._handle = None
+
+    def init(self, mode = PERIODIC, period = -1, callback = None):
+
+        self.deinit()
+        self._mode = mode
+        self._period_s = period / 1000
+        self._callback = callback
+        self._handle = asyncio.get_event_loop().call_later(self._period_s, self._fire)
+
+    def _fire(self):
+
+        if self._mode == Timer.PERIODIC:
+            self._handle = asyncio.get_event_loop().call_later(self._period_s, self._fire)
+        else:
+            self._handle = None
+        self._callback(self)
+
+    def deinit(self):
+
+        if self._handle:
+            self._handle.cancel()
+            self._handle = None
@@ -0,0 +1,66 @@
+# Stand-in for the MicroPython neopixel module. The buffer layout and pixel
+# access match neopixel.py, write() records a copy of every frame with the
+# time it was written and the time the real strip would need on the wire.
+
+import time
+from collections import deque
+
+# WS2812 bits take 1.25 us, a frame ends with a 50 us reset
+_BIT_US = 1.25
+_RESET_US = 50
+
+# every strip created, so a harness can find the one the firmware uses
+strips = []
+
+class NeoPixel:
+
+    ORDER = (1, 0, 2, 3)
+
+    def __init__(self, pin, n, bpp = 3, timing = 1, history = 256):
+
+        self.pin = pin
+        self.n = n
+        self.bpp = bpp
+        self.buf = bytearray(n * bpp)
+        self.timing = timing
+        # (time.monotonic(), frame bytes)
+        self.frames = deque(maxlen = history)
+        self.writes = 0
+        self.wire_us = n * bpp * 8 * _BIT_US + _RESET_US
+        strips.append(self)
+
+    def __len__(self):
+
+        return self.n
+
+    def __setitem__(self, i, v):
+
+        offset = i * self.bpp
+        for i in range(self.bpp):
+            self.buf[offset + self.ORDER[i]] = v[i]
+
+    def __getitem__(self, i):
+
+        offset = i * self.bpp
+        return tuple(self.buf[offset + self.ORDER[i]] for i in range(self.bpp))
+
+    def fill(self, v):
+
+        b = self.buf
+        for i in range(self.bpp):
+            c = v[i]
+            for j in range(self.ORDER[i], len(self.buf), self.bpp):
+                b[j] = c
+
+    def write(self):
+
+        self.writes += 1
+        self.frames.append((time.monotonic(), bytes(self.buf)))
+
+    def fps(self, seconds = 1.0):
+        # Frames written during the last seconds
+
+        if not self.frames:
+            return 0.0
+        now = time.monotonic()
+        return sum(1 for (t, _) in self.frames if now - t <= seconds) / seconds
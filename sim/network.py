@@ -0,0 +1,40 @@
+# Stand-in for the MicroPython network module: a WLAN that is connected right
+# away and reports the host address (SIM_HOST, default 127.0.0.1).
+
+import os
+
+STA_IF = 0
+AP_IF = 1
+
+class WLAN:
+
+    def __init__(self, interface):
+
+        self.interface = interface
+        self._active = False
+        self._config = {'dhcp_hostname': 'espressif'}
+
+    def active(self, *args):
+
+        if args:
+            self._active = bool(args[0])
+        return self._active
+
+    def config(self, *args, **kwargs):
+
+        if args:
+            return self._config[args[0]]
+        self._config.update(kwargs)
+
+    def connect(self, ssid, password):
+
+        pass
+
+    def isconnected(self):
+
+        return self.interface == STA_IF
+
+    def ifconfig(self):
+
+        host = os.environ.get('SIM_HOST', '127.0.0.1')
+        return (host, '255.255.255.0', host, host)
@@ -0,0 +1,31 @@
+# Runs the unmodified firmware under CPython.
+#
+#   python3 sim/run.py [port]
+#
+# The stand-ins in this directory replace the MicroPython modules, the
+# server listens on 127.0.0.1:8080 (or port) with the credentials from
+# sim/credentials.py. Files are read from and written to the repository
+# root, like they are on the device's filesystem.
+
+import os
+import sys
+
+_sim = os.path.dirname(os.path.abspath(__file__))
+_root = os.path.dirname(_sim)
+
+if len(sys.argv) > 1:
+    os.environ['SIM_PORT'] = sys.argv[1]
+
+sys.path[:0] = [_sim, _root]
+
+# firmware modules shadow the standard library ones of the same name
+sys.modules.pop('random', None)
+
+os.chdir(_root)
+
+# the simulated reset, for the boot time metric
+import utime
+import metrics
+metrics.reset_ticks = utime.ticks_ms()
+
+import main
@@ -0,0 +1,36 @@
+# Stand-in for MicroPython's uasyncio on top of CPython asyncio. Adds what
+# the firmware uses beyond the CPython API: sleep_ms, StreamReader.readinto,
+# str writes, and moves the server from port 80 to SIM_PORT (default 8080)
+# so it runs without root.
+
+import os
+import asyncio
+from asyncio import *
+
+async def sleep_ms(ms):
+
+    await asyncio.sleep(ms / 1000)
+
+async def _readinto(self, buf):
+
+    data = await self.read(len(buf))
+    buf[:len(data)] = data
+    return len(data)
+
+StreamReader.readinto = _readinto
+
+_write = StreamWriter.write
+
+def _write_str(self, data):
+
+    _write(self, data.encode() if isinstance(data, str) else data)
+
+StreamWriter.write = _write_str
+
+async def start_server(callback, host, port, backlog = 5):
+
+    if port == 80:
+        port = int(os.environ.get('SIM_PORT', '8080'))
+    server = await asyncio.start_server(callback, host, port, backlog = backlog)
+    async with server:
+        await server.serve_forever()
@@ -0,0 +1,18 @@
+# Stand-in for the MicroPython urandom module. The firmware's random.py
+# shadows the standard library module, so the generator comes from _random.
+
+import _random
+
+_rng = _random.Random()
+
+def seed(n):
+
+    _rng.seed(n)
+
+def getrandbits(n):
+
+    return _rng.getrandbits(n) if n else 0
+
+def random():
+
+    return _rng.random()
@@ -0,0 +1,51 @@
+# Stand-in for the MicroPython utime module. Ticks wrap like they do on the
+# ESP8266 (small int range), so wrap-around bugs show up on the host too.
+
+import time as _time
+
+_TICKS_PERIOD = 1 << 30
+_TICKS_MAX = _TICKS_PERIOD - 1
+_TICKS_HALF = _TICKS_PERIOD >> 1
+
+# start close to the wrap so it happens within the first minute
+_offset_ms = _TICKS_PERIOD - 30000 - int(_time.monotonic() * 1000)
+
+def ticks_ms():
+
+    return (int(_time.monotonic() * 1000) + _offset_ms) & _TICKS_MAX
+
+def ticks_us():
+
+    return (int(_time.monotonic() * 1000000) + _offset_ms * 1000) & _TICKS_MAX
+
+def ticks_add(ticks, delta):
+
+    return (ticks + delta) & _TICKS_MAX
+
+def ticks_diff(end, start):
+
+    return ((end - start + _TICKS_HALF) & _TICKS_MAX) - _TICKS_HALF
+
+def sleep(seconds):
+
+    _time.sleep(seconds)
+
+def sleep_ms(ms):
+
+    _time.sleep(ms / 1000)
+
+def sleep_us(us):
+
+    _time.sleep(us / 1000000)
+
+def time():
+
+    return int(_time.time())
+
+def gmtime(seconds = None):
+
+    return _time.gmtime(seconds)
+
+def localtime(seconds = None):
+
+    return _time.localtime(seconds)
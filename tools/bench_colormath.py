@@ -0,0 +1,210 @@
+# Host-side accuracy check and benchmark of the fixed point color math.
+#
+#   python3 tools/bench_colormath.py
+#   micropython tools/bench_colormath.py
+#
+# Compares colormath with the float conversions rgbled used before:
+# - accuracy: largest channel difference of hsv2rgb over a hue/sat/value grid
+#   and of the rgb2hsv -> hsv2rgb round trip over an RGB grid (must be <= 1)
+# - conversions per second of hsv2rgb and rgb2hsv
+# - garbage per 1000 breathe frames of 60 LEDs. MicroPython: the bytes
+#   allocated and the collections they cost with the free heap of the
+#   device. CPython: the allocations, counted as memory blocks taken between
+#   two opcodes. CPython boxes every int above 256 but takes most floats from
+#   a free list, the device does the opposite, so only the MicroPython
+#   figures tell which version makes less garbage on the device.
+
+import os
+import sys
+import gc
+import math
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..') if '__file__' in globals() else '..')
+
+import colormath
+
+# -----------------------------------------------------------------------------
+# float conversions as they were in rgbled
+
+def _hsv2rgb(h, s, v):
+
+    c = v * s
+    hp = h / 60.0
+    x = c * (1 - math.fabs(math.fmod(hp, 2) - 1))
+    m = v - c
+    x = round(255 * (x + m))
+    c = round(255 * (c + m))
+    m = round(255 * m)
+    hp = int(hp) % 6
+    if hp == 0:
+        return c, x, m
+    elif hp == 1:
+        return x, c, m
+    elif hp == 2:
+        return m, c, x
+    elif hp == 3:
+        return m, x, c
+    elif hp == 4:
+        return x, m, c
+    elif hp == 5:
+        return c, m, x
+
+def _rgb2hsv(r, g, b):
+
+    r /= 255
+    g /= 255
+    b /= 255
+
+    maxc = max(r, g, b)
+    minc = min(r, g, b)
+    v = maxc
+
+    if minc == maxc:
+        return 0.0, 0.0, v
+
+    s = (maxc-minc) / maxc
+    rc = (maxc-r) / (maxc-minc)
+    gc = (maxc-g) / (maxc-minc)
+    bc = (maxc-b) / (maxc-minc)
+    if r == maxc:
+        h = bc-gc
+    elif g == maxc:
+        h = 2.0+rc-bc
+    else:
+        h = 4.0+gc-rc
+    h = (h/6.0) % 1.0
+
+    return h * 360.0, s, v
+
+# -----------------------------------------------------------------------------
+# accuracy
+
+def check_accuracy():
+
+    worst = 0
+    for h in range(0, colormath.HUE_MAX, 3):
+        for s in range(0, 256, 17):
+            for v in range(0, 256, 17):
+                fixed = colormath.hsv2rgb(h, s << 8, v << 8)
+                ref = _hsv2rgb(h * 360 / colormath.HUE_MAX, s / 255, v / 255)
+                worst = max(worst, max(abs(fixed[i] - ref[i]) for i in range(3)))
+    print('hsv2rgb max error vs float:      ', worst)
+    assert worst <= 1
+
+    worst = 0
+    for r in range(0, 256, 15):
+        for g in range(0, 256, 15):
+            for b in range(0, 256, 15):
+                (h, s, v) = colormath.rgb2hsv(r, g, b)
+                back = colormath.hsv2rgb(h, s, v)
+                worst = max(worst, abs(back[0] - r), abs(back[1] - g), abs(back[2] - b))
+                (fh, fs, fv) = _rgb2hsv(r, g, b)
+                assert abs(v / colormath.SV_MAX - fv) < 1 / 255
+                assert abs(s / colormath.SV_MAX - fs) < 2 / 255
+    print('rgb2hsv -> hsv2rgb max error:    ', worst)
+    assert worst <= 1
+
+# -----------------------------------------------------------------------------
+# throughput
+
+def rate(f, n):
+
+    start = time.time()
+    f(n)
+    return n / (time.time() - start)
+
+def _float_hsv(n):
+
+    for i in range(n):
+        _hsv2rgb(i % 360, 0.75, 0.5)
+
+def _fixed_hsv(n):
+
+    for i in range(n):
+        colormath.hsv2rgb(i % colormath.HUE_MAX, 0xC000, 0x8000)
+
+def _float_rgb(n):
+
+    for i in range(n):
+        _rgb2hsv(i & 0xff, 100, 200)
+
+def _fixed_rgb(n):
+
+    for i in range(n):
+        colormath.rgb2hsv(i & 0xff, 100, 200)
+
+# -----------------------------------------------------------------------------
+# breathe frames
+
+_pixels = bytearray(60 * 3)
+
+def _float_breathe(frames):
+
+    (h, s, v) = _rgb2hsv(255, 100, 20)
+    value = v / 2
+    step = 0.002 * v
+    for _ in range(frames):
+        value = value + step if value < v - step else v / 2
+        rgb = _hsv2rgb(h, s, value)
+        for i in range(0, len(_pixels), 3):
+            _pixels[i] = rgb[1]
+            _pixels[i + 1] = rgb[0]
+            _pixels[i + 2] = rgb[2]
+
+def _fixed_breathe(frames):
+
+    (h, s, v) = colormath.rgb2hsv(255, 100, 20)
+    value = v >> 1
+    step = 2 * v // 1000
+    for _ in range(frames):
+        value = value + step if value < v - step else v >> 1
+        rgb = colormath.hsv2rgb(h, s, value)
+        for i in range(0, len(_pixels), 3):
+            _pixels[i] = rgb[1]
+            _pixels[i + 1] = rgb[0]
+            _pixels[i + 2] = rgb[2]
+
+# roughly the heap left to the firmware on the ESP8266
+_device_free_heap = 16 * 1024
+
+def garbage(f, frames = 1000):
+
+    if sys.implementation.name == 'micropython':
+        gc.collect()
+        before = gc.mem_alloc()
+        gc.disable()
+        f(frames)
+        allocated = gc.mem_alloc() - before
+        gc.enable()
+        # a collection runs each time this much was allocated since the last
+        return '{} bytes allocated, {} collections'.format(allocated, allocated // _device_free_heap)
+
+    blocks = [sys.getallocatedblocks(), 0]
+
+    def count(frame, event, arg):
+        frame.f_trace_opcodes = True
+        n = sys.getallocatedblocks()
+        if n > blocks[0]:
+            blocks[1] += n - blocks[0]
+        blocks[0] = n
+        return count
+
+    gc.collect()
+    gc.disable()
+    sys.settrace(count)
+    f(frames)
+    sys.settrace(None)
+    gc.enable()
+    return '{} allocations'.format(blocks[1])
+
+def main():
+
+    check_accuracy()
+
+    n = 50000
+    print('hsv2rgb conversions/s    float {:10.0f}  fixed {:10.0f}'.format(rate(_float_hsv, n), rate(_fixed_hsv, n)))
+    print('rgb2hsv conversions/s    float {:10.0f}  fixed {:10.0f}'.format(rate(_float_rgb, n), rate(_fixed_rgb, n)))
+    print('per 1000 breathe frames  float {}, fixed {}'.format(garbage(_float_breathe), garbage(_fixed_breathe)))
+
+main()
@@ -0,0 +1,138 @@
+# Host-side benchmark of the LED strip effects.
+#
+#   python3 tools/bench_effects.py [seconds per case]
+#
+# Compares frames per second of the per-pixel rainbow and fire effects (as
+# they were before the precomputed frames) with the current rgbled ones at
+# 60, 150 and 300 LEDs, then times the dithering stage at 12 and 16 bits
+# depth. The NeoPixel driver and the other MicroPython modules are the
+# simulator's stand-ins (sim/). Its write() keeps a copy of the frame,
+# which both sides pay alike.
+
+import os
+import sys
+import time
+
+_root = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path[:0] = [os.path.join(_root, 'sim'), _root]
+
+# firmware modules shadow the standard library ones of the same name
+sys.modules.pop('random', None)
+
+import math
+import rgbled
+import effects
+
+# -----------------------------------------------------------------------------
+# effects as they were before precomputed frames
+
+def _hsv2rgb(h, s, v):
+
+    c = v * s
+    hp = h / 60.0
+    x = c * (1 - math.fabs(math.fmod(hp, 2) - 1))
+    m = v - c
+    x = round(255 * (x + m))
+    c = round(255 * (c + m))
+    m = round(255 * m)
+    hp = int(hp) % 6
+    if hp == 0:
+        return c, x, m
+    elif hp == 1:
+        return x, c, m
+    elif hp == 2:
+        return m, c, x
+    elif hp == 3:
+        return m, x, c
+    elif hp == 4:
+        return x, m, c
+    elif hp == 5:
+        return c, m, x
+
+def _randint(Nmin, Nmax):
+    # random.randint as it was
+
+    Oldint = sys.modules['urandom'].getrandbits(31)
+    return round((Nmin - 0.5) + Oldint * (Nmax - Nmin + 1) / sys.maxsize)
+
+_hue = 0
+
+def rainbow_per_pixel():
+
+    global _hue
+    drv = rgbled._led_strip_drv
+    cie = rgbled._cie_lut_8b[0]
+
+    hue_step = 360 / drv.n
+
+    for led in range(drv.n):
+        led_hue = (_hue + hue_step * led) % 360
+        drv[led] = tuple(cie[x] for x in _hsv2rgb(led_hue, 1.0, 1.0))
+    drv.write()
+
+    _hue += 1
+
+def fire_per_pixel():
+
+    drv = rgbled._led_strip_drv
+    cie = rgbled._cie_lut_8b[0]
+
+    rgb = (217, 109, 0)
+
+    for led in range(drv.n):
+        flicker = _randint(0, 50)
+        drv[led] = tuple(cie[x - flicker] if x-flicker >= 0 else 0 for x in rgb)
+    drv.write()
+
+# -----------------------------------------------------------------------------
+# benchmark
+
+def registered(name, dt_ms):
+    # t advances dt_ms per call, enough for the effect to draw every frame
+
+    effect = effects.create(name)
+    effect.setup({})
+    t = [0]
+    frame = memoryview(rgbled.strip_frame())
+    def render():
+        t[0] += dt_ms
+        effect.render(frame, t[0]) and rgbled.strip_write()
+    return render
+
+def fps(effect, seconds):
+
+    effect()
+    frames = 0
+    start = time.time()
+    while time.time() - start < seconds:
+        for _ in range(10):
+            effect()
+        frames += 10
+    return frames / (time.time() - start)
+
+def main():
+
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 1.0
+
+    print('{:8} {:>6} {:>12} {:>12} {:>8}'.format('effect', 'leds', 'before fps', 'after fps', 'speedup'))
+    for leds in (60, 150, 300):
+        rgbled.strip_init(14, leds)
+        for (name, before, after) in (('rainbow', rainbow_per_pixel, registered('rainbow', 20)),
+                                      ('fire', fire_per_pixel, registered('fire', 50))):
+            b = fps(before, seconds)
+            a = fps(after, seconds)
+            print('{:8} {:6} {:12.0f} {:12.0f} {:7.1f}x'.format(name, leds, b, a, a / b))
+
+    print()
+    print('{:8} {:>6} {:>12} {:>12}'.format('depth', 'leds', 'dither us', 'rainbow fps'))
+    for depth in (12, 16):
+        for leds in (60, 150, 300):
+            rgbled.strip_init(14, leds, depth)
+            us = 1000000 / fps(rgbled.strip_dither, seconds)
+            render = registered('rainbow', 20)
+            def dithered():
+                render()
+                rgbled.strip_dither()
+            print('{:8} {:6} {:12.1f} {:12.0f}'.format(depth, leds, us, fps(dithered, seconds)))
+
+main()
@@ -0,0 +1,227 @@
+# Host-side micro-benchmark of the httpserver request parser.
+#
+# Compares the buffer based parser (httpserver._Request) with the previous
+# readline() based one. Runs under CPython and the MicroPython unix port:
+#
+#   python3 tools/bench_parser.py
+#   micropython tools/bench_parser.py
+#
+# Allocations per request are measured differently on the two:
+# - MicroPython: the exact gc.mem_alloc() growth, the figure that matters on
+#   the device
+# - CPython: the coroutines started (each is a heap allocated generator on
+#   MicroPython), the bytes the parser keeps (url, body) and the tracemalloc
+#   peak. CPython frees memory at once and its frames are far larger, so the
+#   peak is no estimate of the device figure.
+
+import sys
+import gc
+import time
+
+_root = __file__.rsplit('/', 2)[0] if '/' in __file__ else '..'
+sys.path.insert(0, _root)
+# CPython takes the MicroPython modules from the simulator's stand-ins
+if sys.implementation.name != 'micropython':
+    sys.path.insert(0, _root + '/sim')
+
+import httpserver
+
+_request = (b'POST /color HTTP/1.1\r\n'
+            b'Host: 192.168.1.10\r\n'
+            b'User-Agent: Mozilla/5.0 (X11; Linux x86_64; rv:109.0) Gecko/20100101 Firefox/115.0\r\n'
+            b'Accept: */*\r\n'
+            b'Accept-Language: en-US,en;q=0.5\r\n'
+            b'Accept-Encoding: gzip, deflate\r\n'
+            b'Content-Type: application/json\r\n'
+            b'Content-Length: 23\r\n'
+            b'Authorization: Basic YWRtaW46c2VjcmV0\r\n'
+            b'Connection: keep-alive\r\n'
+            b'\r\n'
+            b'{"r":255,"g":128,"b":0}')
+
+# a Chrome reload of the page, with its client hints, fetch metadata and
+# validators; most of these headers are skipped by the parser
+_reload = (b'GET / HTTP/1.1\r\n'
+           b'Host: 192.168.1.10\r\n'
+           b'Connection: keep-alive\r\n'
+           b'Cache-Control: max-age=0\r\n'
+           b'Authorization: Basic YWRtaW46c2VjcmV0\r\n'
+           b'sec-ch-ua: "Chromium";v="124", "Google Chrome";v="124", "Not-A.Brand";v="99"\r\n'
+           b'sec-ch-ua-mobile: ?0\r\n'
+           b'sec-ch-ua-platform: "Linux"\r\n'
+           b'Upgrade-Insecure-Requests: 1\r\n'
+           b'User-Agent: Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0.0.0 Safari/537.36\r\n'
+           b'Accept: text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8,'
+           b'application/signed-exchange;v=b3;q=0.7\r\n'
+           b'Sec-Fetch-Site: same-origin\r\n'
+           b'Sec-Fetch-Mode: navigate\r\n'
+           b'Sec-Fetch-User: ?1\r\n'
+           b'Sec-Fetch-Dest: document\r\n'
+           b'Referer: http://192.168.1.10/\r\n'
+           b'Accept-Encoding: gzip, deflate\r\n'
+           b'Accept-Language: en-US,en;q=0.9,de;q=0.8\r\n'
+           b'Cookie: sid=6720c3f1.3f9a0c5be1d27a4086f1b2c3d4e5f607\r\n'
+           b'If-None-Match: "5f3a-1a2b"\r\n'
+           b'If-Modified-Since: Thu, 01 Jan 1970 00:00:00 GMT\r\n'
+           b'\r\n')
+
+class _Reader:
+    # Replays the same request forever, in TCP-sized pieces
+
+    def __init__(self, data, segment = 536):
+
+        self.data = data
+        self.mv = memoryview(data)
+        self.segment = segment
+        self.pos = 0
+
+    def _next(self, n):
+
+        if self.pos == len(self.data):
+            self.pos = 0
+        n = min(n, self.segment, len(self.data) - self.pos)
+        chunk = self.mv[self.pos:self.pos + n]
+        self.pos += n
+        return chunk
+
+    async def readinto(self, buf):
+
+        chunk = self._next(len(buf))
+        buf[0:len(chunk)] = chunk
+        return len(chunk)
+
+    async def readline(self):
+
+        line = b''
+        while not line.endswith(b'\n'):
+            i = self.data.find(b'\n', self.pos)
+            if i < 0 or self.pos == len(self.data):
+                self.pos = 0
+                continue
+            line += self.data[self.pos:i + 1]
+            self.pos = i + 1
+        return line
+
+    async def readexactly(self, n):
+
+        data = b''
+        while len(data) < n:
+            data += bytes(self._next(n - len(data)))
+        return data
+
+async def _parse_readline(reader):
+    # The parser httpserver used before _Request
+
+    start = await reader.readline()
+
+    body_length = 0
+    authorization = None
+    while True:
+        header = await reader.readline()
+        if header == b'\r\n' or header == b'' or header == None:
+            break
+        if b'Content-Length' in header:
+            body_length = int(''.join(list(filter(str.isdigit, header.decode()))))
+        if b'Authorization' in header:
+            authorization = header.decode()
+        if b'Connection' in header:
+            connection = header.decode().split(':', 1)[1].strip()
+
+    body = await reader.readexactly(body_length)
+    (method, url, version) = start.decode().split(' ')
+    httpserver._equals(authorization.split(':', 1)[1].strip().split(' ', 1)[1].encode(), httpserver._auth_token)
+    return body.decode('utf-8')
+
+async def _parse_buffer(req):
+    # What _request_handler does before calling the handler
+
+    # the handler awaits the same coroutines, only under a timeout if the
+    # data is not buffered yet
+    await req.start_line()
+    await req.read_headers()
+    await req.read_body()
+    httpserver._authenticate(req)
+    req.header_has(b'connection', b'close', b'Close')
+    req.header_contains(b'if-none-match', b'"5f3a-1a2b"')
+    return req.body
+
+def _run(coro):
+
+    # drive the coroutine by hand, the fake reader never blocks
+    try:
+        coro.send(None)
+    except StopIteration as e:
+        return e.value
+    raise RuntimeError('parser blocked')
+
+def _alloc_micropython(parse):
+
+    coro = parse()
+    gc.collect()
+    gc.disable()
+    before = gc.mem_alloc()
+    _run(coro)
+    after = gc.mem_alloc()
+    gc.enable()
+    return '{:8} bytes allocated/req'.format(after - before)
+
+def _alloc_cpython(parse):
+
+    import tracemalloc
+
+    # frames are kept so a freed coroutine's id is not counted twice
+    frames = {}
+
+    def profile(frame, event, arg):
+        if event == 'call' and frame.f_code.co_flags & 0x80:
+            frames[id(frame)] = frame
+
+    sys.setprofile(profile)
+    _run(parse())
+    sys.setprofile(None)
+    # the first coroutine is the benchmark's own
+    coroutines = len(frames) - 1
+    frames.clear()
+
+    coro = parse()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    result = _run(coro)
+    (current, peak) = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+
+    return '{:4} coroutines/req {:6} bytes kept/req {:6} bytes peak/req'.format(coroutines, current - before, peak - before)
+
+def _bench(name, parse, n, body):
+
+    assert _run(parse()) == body
+
+    if sys.implementation.name == 'micropython':
+        alloc = _alloc_micropython(parse)
+    else:
+        alloc = _alloc_cpython(parse)
+
+    gc.collect()
+    start = time.time()
+    for _ in range(n):
+        _run(parse())
+    elapsed = time.time() - start
+
+    print('{:10} {:10.0f} req/s {}'.format(name, n / elapsed, alloc))
+
+def main():
+
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    httpserver.enable_basic_auth('admin', 'secret')
+
+    for (request, body) in ((_request, '{"r":255,"g":128,"b":0}'), (_reload, '')):
+        print(request[:request.find(b' HTTP')].decode(), len(request), 'bytes')
+
+        reader = _Reader(request)
+        _bench('readline', lambda: _parse_readline(reader), n, body)
+
+        req = httpserver._Request(_Reader(request))
+        _bench('buffer', lambda: _parse_buffer(req), n, body)
+
+main()
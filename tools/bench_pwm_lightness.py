@@ -0,0 +1,108 @@
+# Host-side check and benchmark of the pwm_lightness table build.
+#
+#   python3 tools/bench_pwm_lightness.py
+#
+# Compares get_pwm_table with the algorithm it used before, which evaluated
+# the CIE curve again for every dither layer:
+# - the tables must be identical
+# - milliseconds to compute each table before and now, and to load it from
+#   the disk cache
+
+import os
+import sys
+import time
+import shutil
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import pwm_lightness
+
+tables = (
+    (1023, 255, 0),
+    (255, 255, 0),
+    (255, 255, 2),
+    (255, 255, 4),
+    (255, 255, 8)
+)
+
+# -----------------------------------------------------------------------------
+# get_pwm_table as it was
+
+def _get_pwm_table(max_output, max_input = 255, dither_bits = 0):
+
+    _cie1931 = pwm_lightness._cie1931
+
+    if dither_bits > 0 and max_output == 255:
+        dither_steps = pow(2, dither_bits)
+        table = [None] * dither_steps
+
+        for i in range(dither_steps):
+            dither = sum(tuple(((i >> (dither_bits - bit - 1)) & 1) << bit
+                     for bit in range(dither_bits))) << (8 - dither_bits)
+
+            value_gen = (min(255, (round(_cie1931(l_star/max_input) * max_output * 256) + dither)//256)
+                        for l_star in range(max_input+1))
+
+            table[i] = bytes(value_gen) if max_output <= 255 else tuple(value_gen)
+    else:
+        value_gen = (round(_cie1931(l_star/max_input) * max_output)
+                    for l_star in range(max_input+1))
+
+        table = bytes(value_gen) if max_output <= 255 else tuple(value_gen)
+
+    return table
+
+# -----------------------------------------------------------------------------
+# benchmark
+
+def _ms(fn, repeat = 5):
+    # Best of repeat runs
+
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None or elapsed < best else best
+    return best * 1000
+
+def _same(a, b):
+
+    if isinstance(b, list):
+        return len(a) == len(b) and all(list(x) == list(y) for (x, y) in zip(a, b))
+    return list(a) == list(b)
+
+def main():
+
+    cache_dir = tempfile.mkdtemp()
+    print('{:16} {:>10} {:>10} {:>10}'.format('table', 'before ms', 'now ms', 'disk ms'))
+
+    try:
+        for key in tables:
+            def build():
+                pwm_lightness.set_cache_dir(None)
+                pwm_lightness.clear_table_cache()
+                return pwm_lightness.get_pwm_table(*key)
+
+            def load():
+                pwm_lightness.set_cache_dir(cache_dir)
+                pwm_lightness.clear_table_cache()
+                return pwm_lightness.get_pwm_table(*key)
+
+            if not _same(build(), _get_pwm_table(*key)):
+                sys.exit('{}: table differs'.format(key))
+
+            # the first load stores the file
+            load()
+            if not _same(load(), _get_pwm_table(*key)):
+                sys.exit('{}: cached table differs'.format(key))
+
+            print('{:16} {:10.2f} {:10.2f} {:10.3f}'.format(
+                '{},{},{}'.format(*key), _ms(lambda: _get_pwm_table(*key)), _ms(build), _ms(load)))
+    finally:
+        pwm_lightness.set_cache_dir(None)
+        shutil.rmtree(cache_dir)
+
+if __name__ == '__main__':
+    main()
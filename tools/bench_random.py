@@ -0,0 +1,147 @@
+# Host-side distribution check and benchmark of the random module.
+#
+#   python3 tools/bench_random.py [seconds per case]
+#
+# Compares random with the float based shim it replaced:
+# - distribution: chi-square of randint, randrange, choice and fill over a
+#   few ranges and of pairs of consecutive values against the 0.1% critical
+#   value, and the bounds (must pass)
+# - the old randint on the device's 32-bit maxsize and on the host's
+# - calls per second of randint and bytes per second of fill against
+#   getrandbits(8) per byte, which the fire effect used
+
+import os
+import sys
+import time
+
+_root = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path[:0] = [os.path.join(_root, 'sim'), _root]
+
+# firmware modules shadow the standard library ones of the same name
+sys.modules.pop('random', None)
+
+import random
+import urandom
+
+# -----------------------------------------------------------------------------
+# randint as it was
+
+def _rescale(Nmin, Nmax, OldValue, maxsize):
+
+    NewRange = Nmax - Nmin
+    NewValue = OldValue * NewRange / maxsize + Nmin
+    return NewValue
+
+def _randint(Nmin, Nmax, maxsize = sys.maxsize):
+
+    Oldint = urandom.getrandbits(31)
+    N = round(_rescale(Nmin-0.5, Nmax+0.5, Oldint, maxsize))
+    return N
+
+# -----------------------------------------------------------------------------
+# distribution
+
+def _chi2_limit(k):
+    # Chi-square value exceeded with probability 0.1% for k - 1 degrees of
+    # freedom (Wilson-Hilferty approximation)
+
+    df = k - 1
+    z = 3.09
+    return df * (1 - 2 / (9 * df) + z * (2 / (9 * df)) ** 0.5) ** 3
+
+def _check(name, values, lo, hi):
+    # Returns True if values look uniform over lo..hi
+
+    counts = [0] * (hi - lo + 1)
+    for v in values:
+        if v < lo or v > hi:
+            print('{:28} out of range: {}'.format(name, v))
+            return False
+        counts[v - lo] += 1
+
+    expected = len(values) / len(counts)
+    chi2 = sum((c - expected) ** 2 / expected for c in counts)
+    limit = _chi2_limit(len(counts))
+    ok = chi2 < limit
+    print('{:28} chi2 {:9.1f} < {:9.1f} {}'.format(name, chi2, limit, 'ok' if ok else 'FAILED'))
+    return ok
+
+def distribution(n = 200000):
+
+    ok = True
+    for (lo, hi) in ((0, 1), (10, 50), (0, 255), (-5, 5), (0, 999)):
+        ok &= _check('randint({}, {})'.format(lo, hi), [random.randint(lo, hi) for _ in range(n)], lo, hi)
+
+    ok &= _check('randrange(7)', [random.randrange(7) for _ in range(n)], 0, 6)
+    # two draws per value above 16 bits, only the low 10 bits are counted
+    ok &= _check('randrange(100000) % 1000', [random.randrange(100000) % 1000 for _ in range(n)], 0, 999)
+    ok &= _check('choice', [random.choice((0, 1, 2, 3, 4)) for _ in range(n)], 0, 4)
+
+    for (lo, hi) in ((0, 255), (0, 15), (0, 50), (100, 200)):
+        buf = bytearray(n)
+        random.fill(buf, lo, hi)
+        ok &= _check('fill({}, {})'.format(lo, hi), list(buf), lo, hi)
+
+    # consecutive values must be independent too, the fire effect draws a
+    # frame of neighbouring pixels at once
+    buf = bytearray(n)
+    random.fill(buf, 0, 15)
+    ok &= _check('fill(0, 15) pairs', [buf[i] * 16 + buf[i + 1] for i in range(0, n, 2)], 0, 255)
+
+    # odd lengths end on half a step
+    buf = bytearray(3)
+    random.fill(buf, 1, 2)
+    ok &= all(1 <= v <= 2 for v in buf)
+
+    print()
+    for (name, maxsize) in (('device', (1 << 31) - 1), ('host', sys.maxsize)):
+        values = [_randint(0, 50, maxsize) for _ in range(20000)]
+        print('old randint(0, 50) {:7}    min {:3} max {:3}'.format(name, min(values), max(values)))
+
+    return ok
+
+# -----------------------------------------------------------------------------
+# throughput
+
+def _rate(fn, seconds):
+
+    fn()
+    calls = 0
+    start = time.time()
+    while time.time() - start < seconds:
+        for _ in range(100):
+            fn()
+        calls += 100
+    return calls / (time.time() - start)
+
+def throughput(seconds):
+
+    print()
+    print('{:28} {:>14} {:>14} {:>8}'.format('', 'before /s', 'after /s', 'speedup'))
+
+    b = _rate(lambda: _randint(0, 50), seconds)
+    a = _rate(lambda: random.randint(0, 50), seconds)
+    print('{:28} {:14.0f} {:14.0f} {:7.1f}x'.format('randint(0, 50) calls', b, a, a / b))
+
+    buf = bytearray(180)
+    getrandbits = urandom.getrandbits
+
+    def per_byte():
+        for i in range(len(buf)):
+            buf[i] = getrandbits(8)
+
+    b = _rate(per_byte, seconds) * len(buf)
+    a = _rate(lambda: random.fill(buf, 0, 255), seconds) * len(buf)
+    print('{:28} {:14.0f} {:14.0f} {:7.1f}x'.format('bytes (180 per fill)', b, a, a / b))
+
+def main():
+
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 1.0
+
+    ok = distribution()
+    throughput(seconds)
+    if not ok:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
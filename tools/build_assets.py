@@ -0,0 +1,31 @@
+# Host-side build step producing gzip variants of the static web assets.
+#
+#   python3 tools/build_assets.py
+#
+# Writes <asset>.gz next to every asset. Upload the .gz files together with
+# the raw ones, the server picks the variant matching the client's
+# Accept-Encoding header. The gzip header carries no file name and a zero
+# timestamp, so rebuilding unchanged assets gives identical files.
+
+import os
+import sys
+import gzip
+
+assets = ('page.html', 'script.js', 'styles.css', 'favicon.ico', '404.html')
+
+def build(root):
+
+    for asset in assets:
+        path = os.path.join(root, asset)
+        with open(path, 'rb') as f:
+            data = f.read()
+
+        with open(path + '.gz', 'wb') as f:
+            with gzip.GzipFile(filename = '', mode = 'wb', fileobj = f, compresslevel = 9, mtime = 0) as gz:
+                gz.write(data)
+
+        size = os.path.getsize(path + '.gz')
+        print('{:12} {:6} -> {:6} bytes ({:.1f}x)'.format(asset, len(data), size, len(data) / size))
+
+if __name__ == '__main__':
+    build(sys.argv[1] if len(sys.argv) > 1 else os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
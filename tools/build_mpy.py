@@ -0,0 +1,139 @@
+# Host-side build step producing the files to upload to the device.
+#
+#   python3 tools/build_mpy.py [--mpy-cross mpy-cross] [--out build]
+#
+# First regenerates cie_tables.py, the CIE 1931 tables of the LED strip baked
+# in as bytes constants, so they are not computed with floats at every boot:
+# the 8-bit ones and the one of the depth main.py renders at (STRIP_DEPTH).
+# Then cross-compiles the modules to .mpy with mpy-cross (pip install
+# mpy-cross, its version must match the firmware's .mpy version) into the
+# output directory, next to the files the device needs as they are.
+#
+# The firmware only runs boot.py and main.py from source, so main.py is
+# compiled as app.mpy and a one line main.py importing it is written instead.
+# credentials.py is not copied, upload your own.
+
+import os
+import sys
+import shutil
+import argparse
+import subprocess
+
+_root = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+tables_module = 'cie_tables.py'
+sources = ('boot.py',)
+skipped = ('boot.py', 'main.py', 'credentials.py')
+assets = ('page.html', 'script.js', 'styles.css', 'favicon.ico', '404.html')
+
+def _bytes_literal(data, indent, width = 16):
+
+    lines = []
+    for i in range(0, len(data), width):
+        lines.append(indent + "b'" + ''.join('\\x{:02x}'.format(b) for b in data[i:i + width]) + "'")
+    return '\n'.join(lines)
+
+def _strip_depth(root):
+    # STRIP_DEPTH of main.py, 8 if it is not set
+
+    with open(os.path.join(root, 'main.py')) as f:
+        for line in f:
+            if line.startswith('STRIP_DEPTH ='):
+                return int(line.split('=')[1])
+    return 8
+
+def build_tables(root):
+    # Returns True if cie_tables.py changed
+
+    sys.path.insert(0, root)
+    import pwm_lightness
+
+    strip = pwm_lightness.get_pwm_table(255, 255, 2)
+
+    text = ('# Generated by tools/build_mpy.py, do not edit.\n'
+            '#\n'
+            '# pwm_lightness.get_pwm_table(255, 255, 2), the CIE 1931 tables of the LED\n'
+            '# strip, one per temporal dithering layer\n'
+            '\n'
+            'STRIP_8B = (\n' +
+            ',\n'.join(_bytes_literal(table, '    ') for table in strip) +
+            '\n)\n')
+
+    depth = _strip_depth(root)
+    if depth > 8:
+        table = pwm_lightness.get_pwm_table(255 << (depth - 8), 255)
+        data = b''.join(v.to_bytes(2, 'little') for v in table)
+        text += ('\n'
+                 '# pwm_lightness.get_pwm_table({}, 255), the table of main.STRIP_DEPTH\n'
+                 '# as little endian 16-bit values\n'
+                 '\n'
+                 'STRIP_{}B = (\n'.format(255 << (depth - 8), depth) +
+                 _bytes_literal(data, '    ') +
+                 '\n)\n')
+
+    path = os.path.join(root, tables_module)
+    try:
+        with open(path) as f:
+            if f.read() == text:
+                return False
+    except OSError:
+        pass
+
+    with open(path, 'w') as f:
+        f.write(text)
+    return True
+
+def _mpy_cross(tool, src, dst, name):
+
+    subprocess.run([tool, '-s', name, '-o', dst, src], check = True)
+
+def build(root, out, tool):
+
+    if shutil.which(tool) is None:
+        sys.exit('{} not found, install it with: pip install mpy-cross'.format(tool))
+
+    os.makedirs(out, exist_ok = True)
+    total_src = 0
+    total_mpy = 0
+
+    modules = sorted(f for f in os.listdir(root) if f.endswith('.py') and f not in skipped)
+    for module in modules + ['main.py']:
+        src = os.path.join(root, module)
+        name = 'app' if module == 'main.py' else module[:-3]
+        dst = os.path.join(out, name + '.mpy')
+        _mpy_cross(tool, src, dst, module)
+
+        src_size = os.path.getsize(src)
+        mpy_size = os.path.getsize(dst)
+        total_src += src_size
+        total_mpy += mpy_size
+        print('{:18} {:6} -> {:6} bytes'.format(name + '.mpy', src_size, mpy_size))
+
+    with open(os.path.join(out, 'main.py'), 'w') as f:
+        f.write('import app\n')
+
+    for file in sources:
+        shutil.copy(os.path.join(root, file), out)
+
+    for asset in assets:
+        for file in (asset, asset + '.gz'):
+            if os.path.exists(os.path.join(root, file)):
+                shutil.copy(os.path.join(root, file), out)
+
+    print('{:18} {:6} -> {:6} bytes'.format('total', total_src, total_mpy))
+
+def main():
+
+    parser = argparse.ArgumentParser(description = 'Cross-compile the firmware to .mpy')
+    parser.add_argument('--mpy-cross', default = 'mpy-cross', help = 'mpy-cross executable')
+    parser.add_argument('--out', default = os.path.join(_root, 'build'), help = 'output directory')
+    parser.add_argument('--tables-only', action = 'store_true', help = 'only regenerate ' + tables_module)
+    args = parser.parse_args()
+
+    if build_tables(_root):
+        print('{} regenerated'.format(tables_module))
+    if not args.tables_only:
+        build(_root, args.out, args.mpy_cross)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,169 @@
+# Host-side harness for the httpserver websocket implementation.
+#
+#   python3 tools/ws_harness.py
+#
+# Drives a whole connection (handshake, frames, control frames) through
+# httpserver._conn_handler with fake reader/writer streams, no socket or
+# device needed. Exits with an AssertionError on the first mismatch.
+
+import sys
+import os
+import struct
+
+_root = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path[:0] = [os.path.join(_root, 'sim'), _root]
+
+import uasyncio as asyncio
+import httpserver
+
+class _Reader:
+    # Hands out the scripted input in small pieces to exercise partial reads
+
+    def __init__(self, data, segment = 7):
+
+        self.data = data
+        self.pos = 0
+        self.segment = segment
+
+    async def readinto(self, buf):
+
+        n = min(len(buf), self.segment, len(self.data) - self.pos)
+        buf[0:n] = self.data[self.pos:self.pos + n]
+        self.pos += n
+        return n
+
+class _Writer:
+
+    def __init__(self):
+
+        self.data = bytearray()
+        self.closed = False
+
+    def write(self, data):
+
+        self.data += data.encode() if isinstance(data, str) else data
+
+    async def drain(self):
+
+        pass
+
+    def get_extra_info(self, name):
+
+        return ('127.0.0.1', 50000)
+
+    def close(self):
+
+        self.closed = True
+
+    async def wait_closed(self):
+
+        pass
+
+def frame(opcode, payload, mask = b'\x12\x34\x56\x78'):
+    # Client frames are always masked
+
+    if len(payload) < 126:
+        header = struct.pack('!BB', 0x80 | opcode, 0x80 | len(payload))
+    else:
+        header = struct.pack('!BBH', 0x80 | opcode, 0x80 | 126, len(payload))
+    return header + mask + bytes(b ^ mask[i & 3] for (i, b) in enumerate(payload))
+
+def parse_frames(data):
+    # Server frames are never masked
+
+    frames = []
+    pos = 0
+    while pos < len(data):
+        (b0, b1) = data[pos:pos + 2]
+        assert b1 & 0x80 == 0, 'server frames must not be masked'
+        length = b1 & 0x7f
+        pos += 2
+        if length == 126:
+            (length,) = struct.unpack('!H', data[pos:pos + 2])
+            pos += 2
+        frames.append((b0 & 0x0f, bytes(data[pos:pos + length])))
+        pos += length
+    return frames
+
+received = []
+
+@httpserver.websocket('/ws-harness')
+async def _echo(ws):
+
+    while True:
+        msg = await ws.recv()
+        if msg is None:
+            break
+        (opcode, payload) = msg
+        received.append((opcode, bytes(payload)))
+        ws.send(bytes(payload), opcode)
+
+# key and accept value from RFC 6455, section 1.3
+_handshake = (b'GET /ws-harness HTTP/1.1\r\n'
+              b'Host: server.example.com\r\n'
+              b'Upgrade: websocket\r\n'
+              b'Connection: Upgrade\r\n'
+              b'Sec-WebSocket-Key: dGhlIHNhbXBsZSBub25jZQ==\r\n'
+              b'Sec-WebSocket-Version: 13\r\n'
+              b'\r\n')
+
+def run(data):
+
+    received.clear()
+    writer = _Writer()
+    asyncio.run(httpserver._conn_handler(_Reader(data), writer))
+    assert writer.closed
+    head, _, rest = bytes(writer.data).partition(b'\r\n\r\n')
+    return head, parse_frames(rest)
+
+def test_handshake():
+
+    head, frames = run(_handshake)
+    assert head.startswith(b'HTTP/1.1 101 Switching Protocols\r\n'), head
+    assert b'Sec-WebSocket-Accept: s3pPLMBiTxaQ9kYGzzhZRbK+xOo=' in head, head
+    assert b'Upgrade: websocket' in head
+    # client went away without a close frame, nothing left to say
+    assert frames == [], frames
+
+def test_missing_key():
+
+    head, frames = run(_handshake.replace(b'Sec-WebSocket-Key', b'X-Key'))
+    assert head.startswith(b'HTTP/1.1 400 Bad Request'), head
+
+def test_data_frames():
+
+    color = bytes((255, 128, 0, 2, 0x01, 0x2c))
+    text = b'x' * 300
+    head, frames = run(_handshake + frame(httpserver.WS_BINARY, color) + frame(httpserver.WS_TEXT, text)
+                       + frame(httpserver.WS_CLOSE, b'\x03\xe8'))
+    assert received == [(httpserver.WS_BINARY, color), (httpserver.WS_TEXT, text)], received
+    assert frames == [(httpserver.WS_BINARY, color), (httpserver.WS_TEXT, text),
+                      (httpserver.WS_CLOSE, b'\x03\xe8')], frames
+
+def test_ping():
+
+    head, frames = run(_handshake + frame(httpserver.WS_PING, b'hi') + frame(httpserver.WS_CLOSE, b''))
+    assert received == []
+    assert frames == [(httpserver.WS_PONG, b'hi'), (httpserver.WS_CLOSE, b'\x03\xe8')], frames
+
+def test_unmasked_frame():
+
+    head, frames = run(_handshake + b'\x82\x03abc')
+    assert frames == [(httpserver.WS_CLOSE, b'\x03\xea')], frames
+
+def test_oversized_frame():
+
+    head, frames = run(_handshake + frame(httpserver.WS_BINARY, b'x' * 4000))
+    assert received == []
+    assert frames == [(httpserver.WS_CLOSE, b'\x03\xf1')], frames
+
+def test_fragmented_frame():
+
+    head, frames = run(_handshake + b'\x02\x81' + b'\x00\x00\x00\x00' + b'a')
+    assert frames == [(httpserver.WS_CLOSE, b'\x03\xeb')], frames
+
+if __name__ == '__main__':
+    for name in sorted(globals()):
+        if name.startswith('test_'):
+            globals()[name]()
+            print('ok', name)